@@ -1,13 +1,24 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
 import sys
 import os
+import gc
+import signal
+import time
+import shutil
+import tempfile
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # RAG 시스템 경로 추가
 from rag.query_chat import KNOUChatbot
+from rag.metrics import METRICS, MultiprocessMetrics
+from rag.index_generations import INDEX_POLL_INTERVAL_S, RETIRE_DELAY_S, GenerationWatcher
+from rag.corpus_store import CORPUS_STORE_FILE
+from rag.vector_store import VECTOR_BACKEND, VECTOR_STORE_FILE
 
 # FastAPI 앱 생성
 app = FastAPI(title="KNOU AI Chatbot", description="한국방송통신대학교 AI 챗봇")
@@ -15,10 +26,119 @@ app = FastAPI(title="KNOU AI Chatbot", description="한국방송통신대학교
 # 정적 파일 서빙 (HTML, CSS, JS)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# 챗봇 인스턴스 생성 (서버 시작 시 한 번만)
-print("🤖 KNOU 챗봇 서버 초기화 중...")
-chatbot = KNOUChatbot()
-print("✅ 챗봇 서버 준비 완료!")
+# 챗봇 인스턴스 (load_index()에서 한 번만 생성, 그 전에는 /api/ready가 503)
+# auto_update가 새 색인 세대를 게시하면 백그라운드에서 새 챗봇을 만들어 교체 (재시작 불필요)
+index_watcher = None
+index_ready = threading.Event()
+# pre-fork 워커 프로세스 여부 (색인 확인/교체는 부모 프로세스가 담당)
+prefork_worker = False
+# pre-fork 워커들의 메트릭을 합치는 공유 디렉토리 (부모가 fork 전에 생성)
+worker_metrics = None
+
+def load_index(factory=KNOUChatbot.for_index, retire_delay: float = RETIRE_DELAY_S) -> bool:
+    """색인 스냅샷/코퍼스/벡터 파일과 Gemini 모듈을 불러와 챗봇 준비 → 성공 여부"""
+    global index_watcher
+    if index_watcher is None:
+        print("🤖 KNOU 챗봇 서버 초기화 중...")
+        start = time.perf_counter()
+        try:
+            index_watcher = GenerationWatcher(factory, retire_delay=retire_delay)
+        except Exception as e:
+            print(f"❌ 챗봇 초기화 실패: {e}")
+            return False
+        print(f"✅ 챗봇 서버 준비 완료! ({time.perf_counter() - start:.1f}초)")
+    index_ready.set()
+    return True
+
+def warm_up():
+    # 색인이 아직 없으면(첫 실행) 자동 업데이트가 만들 때까지 주기적으로 재시도
+    while not load_index():
+        time.sleep(INDEX_POLL_INTERVAL_S)
+    index_watcher.start()
+
+def load_shared_chatbot(index_dir: str) -> KNOUChatbot:
+    """pre-fork 부모 프로세스용 챗봇: 메모리 매핑한 코퍼스 파일/벡터 파일만으로 시작
+
+    Chroma 클라이언트(SQLite 연결, HNSW 색인)는 fork 후 워커마다 따로 메모리를 차지하므로
+    VECTOR_BACKEND와 관계없이 로컬 벡터 검색을 사용하고, 로컬 파일이 없는 세대는 불러오지 않습니다.
+    """
+    for name in (CORPUS_STORE_FILE, VECTOR_STORE_FILE):
+        if not os.path.exists(os.path.join(index_dir, name)):
+            raise RuntimeError(f"여러 워커로 실행하려면 색인 세대에 {name} 파일이 필요합니다: {index_dir}")
+    chatbot = KNOUChatbot.for_index(index_dir, vector_backend="local")
+    if chatbot.vector_index is None or chatbot.chroma_client is not None:
+        # 벡터 파일이 코퍼스 파일과 맞지 않아 Chroma로 대신 불러온 경우
+        chatbot.close()
+        raise RuntimeError(f"로컬 벡터 파일을 불러오지 못했습니다 (embed_chunks.py로 다시 내보내기 필요): {index_dir}")
+    return chatbot
+
+# 워커 프로세스 수: 2 이상이면 색인을 불러온 프로세스를 fork해 같은 메모리(copy-on-write)를 공유
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8001"))
+PREFORK_TICK_S = 0.5  # 부모 프로세스가 종료된 워커를 확인하는 간격
+
+# RAG 파이프라인(Chroma 조회, 쿼리 확장, Gemini 스트리밍)은 블로킹 호출이므로
+# 이벤트 루프가 아닌 제한된 작업 스레드에서 실행
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "8"))
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
+_STREAM_END = object()
+
+async def stream_chat(query: str):
+    """작업 스레드에서 chatbot.chat() 제너레이터를 돌리고, asyncio 큐로 청크를 넘겨받아 전달"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # 이벤트 루프가 이미 종료된 경우
+            stopped.set()
+
+    # 요청 시작 시점의 챗봇을 끝까지 사용 → 스트리밍 도중 색인이 교체돼도 같은 세대로 답변
+    chatbot = index_watcher.current
+
+    def produce():
+        answer_stream = chatbot.chat(query)
+        try:
+            for chunk in answer_stream:
+                if stopped.is_set():
+                    break  # 클라이언트 연결 종료
+                put(chunk)
+        except Exception as e:
+            put(e)
+        finally:
+            answer_stream.close()
+            put(_STREAM_END)
+
+    loop.run_in_executor(chat_executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+@app.on_event("startup")
+async def start_index_watcher():
+    # pre-fork 워커는 부모가 불러온 색인만 사용 (새 세대는 부모가 한 번 불러온 뒤 워커를 다시 fork)
+    if prefork_worker:
+        worker_metrics.start_worker()
+        return
+    # 포트를 먼저 열고 색인은 백그라운드에서 로드 (/api/health는 바로 응답, /api/ready는 로드 후 200)
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+async def flush_worker_metrics():
+    # 종료되는 워커의 마지막 기록까지 남김 (부모가 종료된 워커 합계에 합침)
+    if prefork_worker:
+        worker_metrics.flush()
 
 # 요청 모델 정의
 class ChatRequest(BaseModel):
@@ -34,16 +154,17 @@ async def read_root():
 async def chat_stream_endpoint(request: ChatRequest):
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="질문을 입력해주세요.")
+    if not index_ready.is_set():
+        raise HTTPException(status_code=503, detail="챗봇을 준비하는 중입니다. 잠시 후 다시 시도해주세요.",
+                            headers={"Retry-After": "5"})
     
     print(f"💬 사용자 질문 (스트리밍): {request.query}")
 
     async def stream_generator():
         try:
-            # 챗봇의 스트리밍 답변을 비동기적으로 생성
-            answer_stream = chatbot.chat(request.query)
-            for chunk in answer_stream:
+            # 챗봇의 스트리밍 답변을 작업 스레드에서 생성해 도착하는 대로 전달
+            async for chunk in stream_chat(request.query):
                 yield chunk
-                await asyncio.sleep(0.01) # 클라이언트 렌더링을 위한 약간의 딜레이
         except Exception as e:
             print(f"❌ 스트리밍 중 오류: {e}")
             yield "죄송합니다, 답변 생성 중 오류가 발생했습니다."
@@ -54,10 +175,139 @@ async def chat_stream_endpoint(request: ChatRequest):
 # 헬스 체크 엔드포인트
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "message": "KNOU 챗봇 서버가 정상 작동 중입니다."}
+    return {"status": "healthy", "message": "KNOU 챗봇 서버가 정상 작동 중입니다.",
+            "ready": index_ready.is_set()}
 
-if __name__ == "__main__":
+@app.get("/api/ready")
+async def readiness_check():
+    """색인과 모델을 모두 불러와 요청을 바로 처리할 수 있을 때만 200 (로드 중에는 503)"""
+    if not index_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    return {"status": "ready", "index_generation": index_watcher.generation}
+
+@app.get("/api/metrics")
+async def metrics():
+    """단계별 지연 시간 히스토그램 (Prometheus 텍스트 형식)
+
+    pre-fork 워커는 모든 워커(종료된 워커 포함)의 합계를 출력 → 어느 워커가 응답해도 같은 값
+    """
+    if prefork_worker:
+        worker_metrics.flush()
+        body = worker_metrics.render()
+    else:
+        body = METRICS.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def serve_prefork(workers: int, host: str = HOST, port: int = PORT):
+    """색인을 불러온 현재 프로세스를 workers개로 fork해 같은 소켓에서 요청 처리
+
+    코퍼스 파일과 벡터 파일은 메모리 매핑, 키워드/날짜 색인 같은 파이썬 객체는
+    fork 전에 만들어 copy-on-write로 공유하므로 워커를 늘려도 색인 메모리는 한 벌입니다.
+    새 색인 세대가 게시되면 부모가 한 번만 불러온 뒤 새 워커를 fork하고, 이전 워커는
+    처리 중인 요청을 마치고 종료합니다 (워커마다 색인을 다시 만들지 않음).
+    죽은 워커는 다시 fork하고, SIGTERM/SIGINT를 받으면 모든 워커를 종료합니다.
+    """
     import uvicorn
+
+    global worker_metrics
+    config = uvicorn.Config(app, host=host, port=port)
+    sock = config.bind_socket()
+    # 워커별 메트릭 파일 디렉토리 (서버를 다시 시작하면 새로 시작)
+    metrics_dir = tempfile.mkdtemp(prefix="knou-metrics-")
+    worker_metrics = MultiprocessMetrics(metrics_dir)
+
+    workers_by_pid = {}  # pid → 워커가 fork된 색인 세대
+    retiring = set()  # 새 세대 워커로 교체되어 종료 중인 워커
+    stopping = False
+
+    def share_index():
+        # 지금까지 만든 객체를 GC 추적 대상에서 제외 → 워커의 GC가 공유 페이지를 건드려 복사되는 것 방지
+        # (이전 세대 객체는 고정을 풀고 정리한 뒤 다시 고정)
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            global prefork_worker
+            prefork_worker = True
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            uvicorn.Server(config).run(sockets=[sock])
+            os._exit(0)
+        workers_by_pid[pid] = (index_watcher.generation or "초기 구조") if index_watcher is not None else "색인 없음"
+        print(f"👷 워커 시작: pid {pid}")
+
+    def refork():
+        """새 색인을 불러온 부모에서 워커를 모두 새로 fork, 이전 워커는 요청을 마치고 종료(SIGTERM)"""
+        previous = list(workers_by_pid)
+        share_index()
+        for _ in range(workers):
+            spawn()
+        for pid in previous:
+            retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def check_index() -> bool:
+        # 첫 로드에 실패했으면(색인 없음) 다시 로드, 로드했으면 새 세대 확인
+        if index_watcher is None:
+            return load_index(load_shared_chatbot, retire_delay=0)
+        return index_watcher.check()
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers_by_pid):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    # 워커를 만들기 전에 한 번만 로드 (실패하면 색인 없이 시작, 부모가 주기적으로 다시 시도)
+    load_index(load_shared_chatbot, retire_delay=0)
+    share_index()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for _ in range(workers):
+        spawn()
+
+    next_check = time.monotonic() + INDEX_POLL_INTERVAL_S
+    while workers_by_pid:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if not stopping and time.monotonic() >= next_check:
+                if check_index():
+                    refork()
+                next_check = time.monotonic() + INDEX_POLL_INTERVAL_S
+            time.sleep(PREFORK_TICK_S)
+            continue
+        generation = workers_by_pid.pop(pid, None)
+        worker_metrics.archive(pid)
+        if pid in retiring:
+            retiring.discard(pid)
+            print(f"👋 이전 세대 워커 종료: pid {pid} ({generation})")
+        elif not stopping:
+            print(f"⚠️ 워커 종료됨 (pid {pid}, 상태 {status}), 다시 시작합니다.")
+            time.sleep(1)  # 시작 직후 계속 죽는 경우 과도한 재시작 방지
+            spawn()
+    sock.close()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == "__main__":
     print("🚀 KNOU 챗봇 서버 시작...")
-    print("📱 브라우저에서 http://localhost:8001 접속하세요!")
-    uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
+    print(f"📱 브라우저에서 http://localhost:{PORT} 접속하세요!")
+    if WEB_CONCURRENCY > 1:
+        print(f"👥 워커 {WEB_CONCURRENCY}개로 실행 (색인 공유)")
+        if VECTOR_BACKEND != "local":
+            print(f"⚠️ VECTOR_BACKEND={VECTOR_BACKEND}는 워커마다 Chroma 색인을 따로 불러오므로 여러 워커에서는 local로 실행합니다.")
+        serve_prefork(WEB_CONCURRENCY)
+    else:
+        import uvicorn
+        uvicorn.run(app, host=HOST, port=PORT)
@@ -2,12 +2,25 @@
 """
 KNOU 챗봇 자동 업데이트 시스템
 매일 아침 10시에 실행하여 데이터를 업데이트합니다.
+
+각 단계를 한 프로세스 안에서 의존 관계 순서대로 실행합니다.
+- 서로 독립인 크롤링 3개는 동시에 실행
+- 청크 생성/임베딩은 입력 파일 해시가 지난 성공 실행과 같으면 건너뜀 (변경 없는 날은 크롤링만 하고 종료)
 """
+import argparse
+import hashlib
+import json
 import os
 import sys
-import subprocess
 import logging
-from datetime import datetime
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from typing import Callable, Optional
+
+from rag.corpus_store import CORPUS_STORE_PATH
+from rag.index_generations import INDEX_ROOT, current_index_dir
+from rag.prepare_chunks import CHUNKER_VERSION, INPUT_FILES, MANIFEST_FILE, OUTPUT_FILE
 
 # 로그 디렉토리 먼저 생성
 os.makedirs("logs", exist_ok=True)
@@ -15,6 +28,13 @@ os.makedirs("logs", exist_ok=True)
 # 현재 사용 중인 파이썬 경로 가져오기
 PYTHON_PATH = sys.executable
 
+# ✅ 설정
+# 단계별 마지막 성공 실행의 입력 해시 (데이터 볼륨에 저장 → 컨테이너를 다시 만들어도 유지)
+PIPELINE_STATE_PATH = os.getenv("PIPELINE_STATE_PATH", "data/pipeline_state.json")
+RUN_LOG_PATH = "logs/auto_update_runs.jsonl"  # 실행별 단계 소요 시간/처리 건수 (한 줄에 한 실행)
+PIPELINE_WORKERS = 3  # 동시에 실행할 단계 수 (크롤링 3개)
+HASH_BLOCK = 1 << 20
+
 # 로깅 설정
 logging.basicConfig(
     level=logging.INFO,
@@ -25,61 +45,215 @@ logging.basicConfig(
     ]
 )
 
-def run_command(command, description):
-    """명령어 실행 및 로깅"""
-    logging.info(f"🔄 {description} 시작...")
+
+class Stage:
+    """파이프라인 한 단계
+
+    run: 인자 없이 호출, 처리 건수 dict 반환 (실패 시 예외)
+    deps: 먼저 성공(또는 건너뜀)해야 하는 단계 이름
+    inputs: 변경 감지에 쓰는 입력 파일 (None이면 항상 실행)
+    outputs: 건너뛰려면 존재해야 하는 결과 파일 (지워졌으면 입력이 같아도 다시 실행)
+    version: 입력 외에 결과에 영향을 주는 값 (청크 분할 방식 버전 등)
+    """
+
+    def __init__(self, name: str, description: str, run: Callable[[], Optional[dict]], deps=(),
+                 inputs: Optional[list] = None, outputs=(), version: str = ""):
+        self.name = name
+        self.description = description
+        self.run = run
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.outputs = tuple(outputs)
+        self.version = version
+
+    def fingerprint(self) -> Optional[str]:
+        """입력 파일 내용 + 버전 해시 (없는 파일도 '없음'으로 반영)"""
+        if self.inputs is None:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.version.encode("utf-8"))
+        for path in self.inputs:
+            digest.update(b"\0" + path.encode("utf-8") + b"\0")
+            if not os.path.exists(path):
+                digest.update(b"<missing>")
+                continue
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def outputs_exist(self) -> bool:
+        return all(os.path.exists(path) for path in self.outputs)
+
+
+def load_pipeline_state(path: str = PIPELINE_STATE_PATH) -> dict:
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, cwd=os.getcwd())
-        if result.returncode == 0:
-            logging.info(f"✅ {description} 완료")
-            return True
-        else:
-            logging.error(f"❌ {description} 실패: {result.stderr}")
-            return False
-    except Exception as e:
-        logging.error(f"❌ {description} 오류: {e}")
-        return False
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_pipeline_state(state: dict, path: str = PIPELINE_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def run_stage(stage: Stage, state: dict, force: bool = False) -> dict:
+    """단계 하나 실행 → {"status": done/skipped/failed, "seconds", "items"}"""
+    start = time.perf_counter()
+    fingerprint = stage.fingerprint()
+    if not force and fingerprint and state.get(stage.name) == fingerprint and stage.outputs_exist():
+        logging.info(f"⏭️ {stage.description}: 입력 변경 없음 → 건너뜀")
+        return {"status": "skipped", "seconds": round(time.perf_counter() - start, 2), "items": {}}
+
+    logging.info(f"🔄 {stage.description} 시작...")
+    try:
+        items = stage.run() or {}
+    except (Exception, SystemExit) as e:
+        # embed_chunks.main()은 실패 시 exit(1) → 전체 프로세스를 끝내지 않고 단계 실패로 처리
+        seconds = round(time.perf_counter() - start, 2)
+        logging.error(f"❌ {stage.description} 실패 ({seconds}초): {e!r}")
+        return {"status": "failed", "seconds": seconds, "items": {}, "error": repr(e)}
+
+    seconds = round(time.perf_counter() - start, 2)
+    if fingerprint:
+        # 입력 해시는 성공했을 때만 기록 → 실패한 단계는 다음 실행 때 다시 시도
+        state[stage.name] = fingerprint
+    logging.info(f"✅ {stage.description} 완료 ({seconds}초) {items}")
+    return {"status": "done", "seconds": seconds, "items": items}
+
+
+def run_pipeline(stages: list, state: dict, force: bool = False, max_workers: int = PIPELINE_WORKERS) -> dict:
+    """의존 관계를 만족한 단계부터 동시에 실행 → 단계 이름별 결과
+
+    앞 단계가 실패하면 그 뒤 단계는 실행하지 않음 (status: blocked)
+    """
+    pending = {stage.name: stage for stage in stages}
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(dep not in results for dep in stage.deps):
+                    continue
+                del pending[name]
+                failed = [dep for dep in stage.deps if results[dep]["status"] in ("failed", "blocked")]
+                if failed:
+                    logging.warning(f"⛔ {stage.description}: 앞 단계 실패({', '.join(failed)})로 실행하지 않음")
+                    results[name] = {"status": "blocked", "seconds": 0.0, "items": {}}
+                    continue
+                running[executor.submit(run_stage, stage, state, force)] = name
+
+            if not running:
+                # 남은 단계의 의존 단계가 존재하지 않음 (설정 오류)
+                for name in pending:
+                    logging.error(f"❌ {name}: 알 수 없는 의존 단계 {pending[name].deps}")
+                    results[name] = {"status": "blocked", "seconds": 0.0, "items": {}}
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return {stage.name: results[stage.name] for stage in stages}
+
 
-def main():
+# ✅ 단계 정의 (무거운 모듈은 실제로 실행할 때만 import → 변경 없는 날은 빠르게 종료)
+def build_stages() -> list:
+    from crawl.crawler import CrawlState
+
+    # 두 게시판 크롤링이 같은 상태 파일(data/crawl_state.json)을 공유 → 한 객체를 함께 사용
+    crawl_state = CrawlState()
+
+    def crawl_notices():
+        from crawl.update_notices import update_notices
+        return update_notices(state=crawl_state)
+
+    def crawl_cs_notices():
+        from crawl.fetch_cs_update import update_cs_notices
+        return update_cs_notices(state=crawl_state)
+
+    def crawl_schedule():
+        from crawl.fetch_common import update_common_schedule
+        # 다음 학년도 일정은 겨울에 미리 게시됨 → 올해와 내년을 함께 수집
+        year = date.today().year
+        return {"changed_months": len(update_common_schedule(range(year, year + 2)))}
+
+    def chunk():
+        from rag.prepare_chunks import prepare_chunks
+        stats = prepare_chunks(incremental=True)
+        return {"rows": stats["rows"], "skipped_rows": stats["skipped_rows"], "chunks": stats["written"]}
+
+    def embed():
+        from rag.embed_chunks import main as embed_chunks
+        return embed_chunks()
+
+    crawl_names = ("crawl_notices", "crawl_cs_notices", "crawl_schedule")
+    return [
+        Stage("crawl_notices", "일반 공지사항 업데이트", crawl_notices),
+        Stage("crawl_cs_notices", "컴공과 공지사항 업데이트", crawl_cs_notices),
+        Stage("crawl_schedule", "공통 일정 업데이트", crawl_schedule),
+        # 증분 모드: 새 글/수정된 글의 청크만 추가 (manifest가 없으면 전체 생성)
+        Stage("chunk", "청크 파일 생성", chunk, deps=crawl_names,
+              inputs=[entry["path"] for entry in INPUT_FILES],
+              outputs=(OUTPUT_FILE, MANIFEST_FILE, CORPUS_STORE_PATH),
+              version=f"chunker-{CHUNKER_VERSION}"),
+        Stage("embed", "임베딩 생성 및 DB 업데이트", embed, deps=("chunk",),
+              inputs=[OUTPUT_FILE, CORPUS_STORE_PATH],
+              outputs=(os.path.join(current_index_dir(INDEX_ROOT), "chroma.sqlite3"),)),
+    ]
+
+
+def log_summary(results: dict, duration):
+    logging.info("📊 단계별 결과:")
+    for name, result in results.items():
+        items = ", ".join(f"{key}={value}" for key, value in result["items"].items())
+        logging.info(f"   - {name:<17} {result['status']:<8} {result['seconds']:>7.2f}초  {items}")
+    logging.info(f"⏱️ 총 소요 시간: {duration}")
+
+def save_run_log(start_time: datetime, duration, results: dict, path: str = RUN_LOG_PATH):
+    record = {"started": start_time.isoformat(timespec="seconds"),
+              "seconds": round(duration.total_seconds(), 2), "stages": results}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def main(force: bool = False):
     """자동 업데이트 메인 프로세스"""
     start_time = datetime.now()
     logging.info(f"🚀 KNOU 챗봇 자동 업데이트 시작: {start_time}")
     logging.info(f"🐍 파이썬 경로: {PYTHON_PATH}")
-    
-    # 1. 크롤링 실행
-    logging.info("📡 데이터 크롤링 중...")
-    crawl_commands = [
-        (f"{PYTHON_PATH} crawl/update_notices.py", "일반 공지사항 업데이트"),
-        (f"{PYTHON_PATH} crawl/fetch_cs_update.py", "컴공과 공지사항 업데이트"),
-        (f"{PYTHON_PATH} crawl/fetch_common.py", "공통 일정 업데이트")
-    ]
-    
-    crawl_success = True
-    for cmd, desc in crawl_commands:
-        if not run_command(cmd, desc):
-            crawl_success = False
-    
-    if not crawl_success:
-        logging.error("❌ 크롤링 실패로 업데이트 중단")
-        return False
-    
-    # 2. 청크 생성
-    if not run_command(f"{PYTHON_PATH} rag/prepare_chunks.py", "청크 파일 생성"):
-        return False
-    
-    # 3. 임베딩 생성
-    if not run_command(f"{PYTHON_PATH} rag/embed_chunks.py", "임베딩 생성 및 DB 업데이트"):
+
+    state = load_pipeline_state()
+    results = run_pipeline(build_stages(), state, force=force)
+    # 성공한 단계의 입력 해시만 저장 (일부 단계가 실패해도 성공한 단계는 다음에 건너뜀)
+    save_pipeline_state(state)
+
+    duration = datetime.now() - start_time
+    log_summary(results, duration)
+    try:
+        save_run_log(start_time, duration, results)
+    except OSError as e:
+        logging.warning(f"⚠️ 실행 기록 저장 실패: {e}")
+
+    if any(result["status"] in ("failed", "blocked") for result in results.values()):
+        logging.error("❌ 일부 단계 실패로 업데이트 중단")
         return False
-    
-    # 4. 업데이트 완료 로그
-    end_time = datetime.now()
-    duration = end_time - start_time
-    logging.info(f"🎉 자동 업데이트 완료! 소요 시간: {duration}")
-    logging.info("📊 챗봇이 최신 데이터로 업데이트되었습니다.")
-    
+
+    if results["embed"]["status"] == "skipped":
+        logging.info("🎉 자동 업데이트 완료! 변경된 데이터가 없어 색인은 그대로입니다.")
+    else:
+        logging.info("🎉 자동 업데이트 완료!")
+        logging.info("📊 챗봇이 최신 데이터로 업데이트되었습니다.")
     return True
 
-if __name__ == "__main__":    
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KNOU 챗봇 자동 업데이트")
+    parser.add_argument("--force", action="store_true", help="입력 변경이 없어도 청크 생성/임베딩 다시 실행")
+    args = parser.parse_args()
+
     # 업데이트 실행
-    success = main()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    success = main(force=args.force)
+    sys.exit(0 if success else 1)
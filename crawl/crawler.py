@@ -0,0 +1,377 @@
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+
+# ✅ 설정
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+MAX_CONCURRENCY_PER_HOST = 8  # 호스트당 동시 요청 수
+MIN_INTERVAL_PER_HOST = 0.05  # 호스트당 요청 시작 간격(초) - 과부하 방지
+REQUEST_TIMEOUT = 15
+STATE_PATH = os.path.join("data", "crawl_state.json")  # 게시글별 ETag / Last-Modified / 본문 해시
+# ETag/Last-Modified가 없는 글을 다시 받아 본문 해시로 비교하는 최소 간격(초) - 매일 실행 시 실행마다 확인
+RECHECK_INTERVAL_S = 20 * 3600
+NO_CONTENT = "본문 없음"
+BLOCK_TAGS = ["p", "div", "li", "tr", "table", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre"]
+
+
+class Board:
+    """게시판 설정: 목록 URL, 게시글 ID 추출 방식, 학과 필터"""
+
+    def __init__(self, base_url: str, page_url_template: str,
+                 id_from_link: Callable[[str], str], dept: Optional[str] = None):
+        self.base_url = base_url
+        self.page_url_template = page_url_template
+        self.id_from_link = id_from_link
+        self.dept = dept
+
+    def page_url(self, page_num: int) -> str:
+        return self.page_url_template.format(page_num)
+
+
+class HostRateLimiter:
+    """호스트별 동시 요청 수 제한 + 최소 요청 간격 유지"""
+
+    def __init__(self, max_concurrency: int, min_interval: float):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.min_interval = min_interval
+        self.lock = asyncio.Lock()
+        self.last_start = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        async with self.lock:
+            wait = self.last_start + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_start = time.monotonic()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+
+class CrawlState:
+    """게시글 URL별 ETag / Last-Modified / 본문 해시 저장소 (JSON 파일)
+
+    여러 게시판을 동시에 크롤링할 때 하나의 객체를 공유 (갱신/저장은 lock으로 직렬화)
+    """
+
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.articles = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.articles = json.load(f)
+
+    def get(self, url: str) -> dict:
+        return self.articles.get(url, {})
+
+    def conditional_headers(self, url: str) -> dict:
+        """저장된 검증값으로 조건부 요청 헤더 구성 (변경 없으면 서버가 304 응답)"""
+        entry = self.get(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def recheck_due(self, url: str, interval: float = RECHECK_INTERVAL_S) -> bool:
+        """검증값 없는 글의 본문 재확인 시기 여부 (마지막 확인 시각이 없던 이전 기록은 바로 확인)"""
+        return time.time() - self.get(url).get("checked_at", 0) >= interval
+
+    def update(self, url: str, response: requests.Response, content_hash: str):
+        entry = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+            "checked_at": int(time.time())
+        }
+        with self.lock:
+            self.articles[url] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.articles, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class AsyncCrawler:
+    """공유 크롤링 엔진: keep-alive 세션으로 HTML을 받아오고, 요청은 스레드에서 동시에 실행"""
+
+    def __init__(self, max_concurrency_per_host: int = MAX_CONCURRENCY_PER_HOST,
+                 min_interval_per_host: float = MIN_INTERVAL_PER_HOST, timeout: float = REQUEST_TIMEOUT):
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.min_interval_per_host = min_interval_per_host
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_concurrency_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._limiters = {}
+
+    def _limiter(self, url: str) -> HostRateLimiter:
+        # asyncio 객체는 이벤트 루프에 묶이므로 루프별로 따로 생성
+        key = (id(asyncio.get_running_loop()), urlparse(url).netloc)
+        if key not in self._limiters:
+            self._limiters[key] = HostRateLimiter(self.max_concurrency_per_host, self.min_interval_per_host)
+        return self._limiters[key]
+
+    def _get(self, url: str, headers: Optional[dict] = None) -> requests.Response:
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+        response.encoding = "utf-8"
+        return response
+
+    async def fetch_response(self, url: str, headers: Optional[dict] = None) -> requests.Response:
+        async with self._limiter(url):
+            return await asyncio.to_thread(self._get, url, headers)
+
+    async def fetch(self, url: str) -> str:
+        return (await self.fetch_response(url)).text
+
+    async def fetch_many(self, urls: list, headers_list: Optional[list] = None) -> list:
+        """여러 URL을 동시에 요청 → 응답 목록 (실패한 URL은 None)"""
+        headers_list = headers_list or [None] * len(urls)
+
+        async def fetch_or_none(url, headers):
+            try:
+                return await self.fetch_response(url, headers)
+            except Exception as e:
+                print(f"⚠️ 요청 실패: {url} ({e})")
+                return None
+        return await asyncio.gather(*(fetch_or_none(url, headers) for url, headers in zip(urls, headers_list)))
+
+    def close(self):
+        self.session.close()
+
+
+def element_text(elem) -> str:
+    """브라우저 innerText와 비슷하게 줄 단위 텍스트 추출 (블록 요소는 줄바꿈, 표 칸은 탭)"""
+    for br in elem.find_all("br"):
+        br.replace_with("\n")
+    for cell in elem.find_all(["td", "th"]):
+        cell.append("\t")
+    for block in elem.find_all(BLOCK_TAGS):
+        block.append("\n")
+    lines = [line.strip() for line in elem.get_text().split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def parse_list_page(html: str, board: Board) -> list:
+    """목록 페이지 HTML → [{id, title, date, url}, ...] (페이지 순서 유지)"""
+    soup = BeautifulSoup(html, "html.parser")
+    rows = []
+    for row in soup.select("table.board-table tbody tr"):
+        if board.dept:
+            dept_elem = row.select_one("td.td-write")
+            if not dept_elem or dept_elem.get_text().strip() != board.dept:
+                continue  # 다른 학과는 무시
+
+        title_elem = row.select_one("td.td-subject a")
+        link = title_elem.get("href") if title_elem else None
+        if not link:
+            continue
+        date_elem = row.select_one("td.td-date")
+        rows.append({
+            "id": board.id_from_link(link),
+            "title": title_elem.get_text().strip(),
+            "date": date_elem.get_text().strip() if date_elem else "",
+            "url": board.base_url + link
+        })
+    return rows
+
+
+def parse_article(html: str) -> str:
+    """상세 페이지 HTML → 본문 텍스트"""
+    soup = BeautifulSoup(html, "html.parser")
+    content_elem = soup.select_one("div.view-con")
+    return element_text(content_elem) if content_elem else NO_CONTENT
+
+
+async def fetch_list_rows(crawler: AsyncCrawler, board: Board, page_nums) -> list:
+    """목록 페이지들을 동시에 받아 게시글 행 수집 (ID 중복 제거, 페이지 순서 유지)"""
+    page_nums = list(page_nums)
+    responses = await crawler.fetch_many([board.page_url(page_num) for page_num in page_nums])
+
+    rows, seen = [], set()
+    for page_num, response in zip(page_nums, responses):
+        if response is None:
+            continue
+        page_rows = parse_list_page(response.text, board)
+        print(f"📄 목록 페이지 {page_num}: {len(page_rows)}건")
+        for row in page_rows:
+            if row["id"] not in seen:
+                seen.add(row["id"])
+                rows.append(row)
+    return rows
+
+
+def _notice(row: dict, content: str) -> dict:
+    return {
+        "id": row["id"],
+        "title": row["title"],
+        "date": row["date"],
+        "content": content,
+        "url": row["url"]
+    }
+
+
+async def fetch_articles(crawler: AsyncCrawler, rows: list, state: Optional[CrawlState] = None) -> list:
+    """게시글 상세 페이지를 동시에 받아 본문 채우기 (실패한 글은 제외 → 다음 실행 때 다시 수집)"""
+    responses = await crawler.fetch_many([row["url"] for row in rows])
+    notices = []
+    for row, response in zip(rows, responses):
+        if response is None:
+            continue
+        content = parse_article(response.text)
+        if state is not None:
+            state.update(row["url"], response, content_hash(content))
+        notices.append(_notice(row, content))
+    return notices
+
+
+async def revalidate_articles(crawler: AsyncCrawler, rows: list, state: CrawlState) -> list:
+    """이미 수집한 게시글을 확인 → 본문이 바뀐(수정된) 게시글만 반환
+
+    ETag/Last-Modified가 있는 글은 조건부 요청 (변경 없으면 304), 없는 글은 전체를 다시 받아 본문 해시로 비교.
+    rows는 이번 실행에서 본 목록 페이지(보통 1페이지)의 글뿐이고, 검증값 없는 글은 RECHECK_INTERVAL_S에
+    한 번만 다시 받으므로 확인 범위가 제한됩니다 (간격이 지나지 않은 글은 다음 실행으로 미룸)
+    """
+    total = len(rows)
+    rows = [row for row in rows if state.conditional_headers(row["url"]) or state.recheck_due(row["url"])]
+    deferred = total - len(rows)
+    urls = [row["url"] for row in rows]
+    responses = await crawler.fetch_many(urls, [state.conditional_headers(url) for url in urls])
+    updated = []
+    not_modified = unchanged = 0
+    for row, response in zip(rows, responses):
+        if response is None:
+            continue
+        if response.status_code == 304:
+            not_modified += 1
+            continue
+        content = parse_article(response.text)
+        new_hash = content_hash(content)
+        previous_hash = state.get(row["url"]).get("content_hash")
+        state.update(row["url"], response, new_hash)
+        # 이전 해시가 없으면(처음 확인하는 글) 기준값만 저장
+        if previous_hash and previous_hash != new_hash:
+            updated.append(_notice(row, content))
+        elif previous_hash:
+            unchanged += 1
+    print(f"♻️ 기존 게시글 {total}건 확인: 변경 없음(304) {not_modified}건, 본문 동일 {unchanged}건, "
+          f"수정됨 {len(updated)}건, 최근 확인해 생략 {deferred}건")
+    return updated
+
+
+async def crawl_board_incremental_async(board: Board, known_ids, state: CrawlState, max_page: int = 3,
+                                        crawler: Optional[AsyncCrawler] = None) -> tuple:
+    """증분 크롤링: 목록 페이지를 앞에서부터 넘기다가 전부 이미 아는 글인 페이지에서 중단
+
+    반환값: (신규 게시글 목록, 수정된 기존 게시글 목록)
+    """
+    own_crawler = crawler is None
+    crawler = crawler or AsyncCrawler()
+    try:
+        new_rows, known_rows, seen = [], [], set()
+        for page_num in range(1, max_page + 1):
+            response = (await crawler.fetch_many([board.page_url(page_num)]))[0]
+            if response is None:
+                break
+            page_rows = [row for row in parse_list_page(response.text, board) if row["id"] not in seen]
+            seen.update(row["id"] for row in page_rows)
+            page_new = [row for row in page_rows if row["id"] not in known_ids]
+            new_rows.extend(page_new)
+            known_rows.extend(row for row in page_rows if row["id"] in known_ids)
+            print(f"📄 목록 페이지 {page_num}: {len(page_rows)}건 중 신규 {len(page_new)}건")
+            if not page_new:
+                print("⏹️ 페이지 전체가 기존 게시글 → 이후 페이지 생략")
+                break
+
+        new_notices, updated_notices = await asyncio.gather(
+            fetch_articles(crawler, new_rows, state),
+            revalidate_articles(crawler, known_rows, state)
+        )
+        return new_notices, updated_notices
+    finally:
+        if own_crawler:
+            crawler.close()
+
+
+async def crawl_board_async(board: Board, page_nums, skip_ids=None, crawler: Optional[AsyncCrawler] = None) -> list:
+    own_crawler = crawler is None
+    crawler = crawler or AsyncCrawler()
+    try:
+        rows = await fetch_list_rows(crawler, board, page_nums)
+        if skip_ids:
+            rows = [row for row in rows if row["id"] not in skip_ids]
+        print(f"🔗 상세 페이지 {len(rows)}건 동시 수집 중...")
+        return await fetch_articles(crawler, rows)
+    finally:
+        if own_crawler:
+            crawler.close()
+
+
+def crawl_board(board: Board, page_nums, skip_ids=None) -> list:
+    """게시판 크롤링: 목록 페이지 수집 → 게시글 URL 모음 → 상세 페이지 동시 수집"""
+    start = time.perf_counter()
+    notices = asyncio.run(crawl_board_async(board, page_nums, skip_ids))
+    print(f"⏱️ {len(notices)}건 수집 완료 ({time.perf_counter() - start:.1f}초)")
+    return notices
+
+
+def crawl_board_incremental(board: Board, known_ids, max_page: int = 3, state_path: str = STATE_PATH,
+                            state: Optional[CrawlState] = None) -> tuple:
+    """증분 크롤링 (동기 실행용) → (신규 게시글 목록, 수정된 기존 게시글 목록)
+
+    state: 여러 게시판을 동시에 크롤링할 때 공유하는 CrawlState (없으면 state_path에서 로드)
+    """
+    start = time.perf_counter()
+    state = state or CrawlState(state_path)
+    new_notices, updated_notices = asyncio.run(crawl_board_incremental_async(board, known_ids, state, max_page))
+    state.save()
+    print(f"⏱️ 신규 {len(new_notices)}건, 수정 {len(updated_notices)}건 ({time.perf_counter() - start:.1f}초)")
+    return new_notices, updated_notices
+
+
+def replace_csv_rows(path: str, updated_rows: list, fieldnames: list) -> int:
+    """CSV에서 ID가 같은 행을 수정된 내용으로 교체 → 교체한 행 수"""
+    if not updated_rows or not os.path.exists(path):
+        return 0
+    updated_by_id = {row["id"]: row for row in updated_rows}
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    replaced = 0
+    for i, row in enumerate(rows):
+        if row["id"] in updated_by_id:
+            rows[i] = updated_by_id[row["id"]]
+            replaced += 1
+
+    if replaced:
+        with open(path, "w", newline='', encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+    return replaced
@@ -1,7 +1,10 @@
 import requests
 from bs4 import BeautifulSoup
+import argparse
 import csv
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 
 url = "https://www.knou.ac.kr/schdulmanage/knou/26/monthSchdul.do"
 headers = {
@@ -10,12 +13,27 @@ headers = {
     "User-Agent": "Mozilla/5.0"
 }
 
-def fetch_month_schedule(year: int, month: int):
+CSV_PATH = os.path.join("data", "common_schedule.csv")
+FIELDNAMES = ["id", "date", "content"]
+MAX_WORKERS = 6  # 동시에 요청하는 월 수
+LEGACY_SCHEDULE_YEAR = 2025  # 이전 형식(월 정보 없는 id) 파일은 이 해의 일정만 저장했음
+REQUEST_TIMEOUT = 15
+
+def create_session(max_workers: int = MAX_WORKERS) -> requests.Session:
+    """keep-alive 연결을 재사용하는 세션 (월별 요청마다 새 연결을 만들지 않음)"""
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_month_schedule(year: int, month: int, session: requests.Session = None):
     data = {
         "year": str(year),
         "month": str(month).zfill(2)
     }
-    res = requests.post(url, headers=headers, data=data)
+    res = (session or requests).post(url, headers=headers, data=data, timeout=REQUEST_TIMEOUT)
+    res.raise_for_status()
     res.encoding = "utf-8"
     soup = BeautifulSoup(res.text, "html.parser")
     rows = soup.select(".sche-comt tbody tr")
@@ -30,24 +48,102 @@ def fetch_month_schedule(year: int, month: int):
         })
     return events
 
-# 전체 2025년 일정 수집
-all_events = []
-for month in range(1, 13):
-    monthly = fetch_month_schedule(2025, month)
-    all_events.extend(monthly)
-
-# 디렉토리 생성
-os.makedirs("data", exist_ok=True)
-
-# CSV 저장
-with open("data/common_schedule.csv", "w", newline="", encoding="utf-8-sig") as f:
-    writer = csv.DictWriter(f, fieldnames=["id", "date", "content"])
-    writer.writeheader()
-    for i, item in enumerate(all_events, start=1):
-        writer.writerow({
-            "id": i,
-            "date": item["date"],
-            "content": item["content"]
-        })
+def month_key(year: int, month: int) -> str:
+    return f"{year}{month:02d}"
+
+def fetch_schedules(years, max_workers: int = MAX_WORKERS) -> dict:
+    """여러 해의 월별 일정을 하나의 세션으로 동시에 수집 → {월 키: 일정 목록} (실패한 달은 제외)"""
+    months = [(year, month) for year in years for month in range(1, 13)]
+    session = create_session(max_workers)
+
+    def fetch(year_month):
+        year, month = year_month
+        try:
+            return fetch_month_schedule(year, month, session)
+        except Exception as e:
+            print(f"⚠️ {year}년 {month}월 일정 수집 실패: {e}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch, months))
+    finally:
+        session.close()
+
+    return {
+        month_key(year, month): events
+        for (year, month), events in zip(months, results)
+        if events is not None
+    }
+
+def load_existing_schedule(path: str = CSV_PATH) -> dict:
+    """기존 CSV를 월 키별로 묶기 (id 형식: {YYYYMM}-{순번}), 이전 형식 id는 키 None"""
+    if not os.path.exists(path):
+        return {}
+    existing = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            key = row["id"].split("-")[0] if "-" in row["id"] else None
+            existing.setdefault(key, []).append({"date": row["date"], "content": row["content"]})
+    return existing
+
+def update_common_schedule(years, path: str = CSV_PATH, max_workers: int = MAX_WORKERS) -> list:
+    """학사일정 수집 후 기존 CSV와 월 단위로 비교, 바뀐 달이 있을 때만 다시 저장 → 바뀐 월 키 목록"""
+    fetched = fetch_schedules(years, max_workers)
+    existing = load_existing_schedule(path)
+
+    # 이전 형식(월 정보 없는 id) 행은 어느 달인지 알 수 없어 달 단위로 교체할 수 없음
+    # → 그해 12개월을 모두 수집한 실행에서만 새 형식으로 변환, 그 전에는 기존 행을 유지하고 그해 수집 결과는 쓰지 않음
+    legacy_rows = existing.pop(None, [])
+    convert_legacy = False
+    if legacy_rows:
+        legacy_months = {month_key(LEGACY_SCHEDULE_YEAR, month) for month in range(1, 13)}
+        convert_legacy = legacy_months <= fetched.keys()
+        if not convert_legacy:
+            print(f"ℹ️ {LEGACY_SCHEDULE_YEAR}년 일정을 모두 수집하지 못해 이전 형식 {len(legacy_rows)}건을 그대로 유지합니다.")
+            for key in legacy_months:
+                fetched.pop(key, None)
+
+    changed_months = sorted(key for key, events in fetched.items() if existing.get(key, []) != events)
+
+    if not changed_months and not convert_legacy:
+        print(f"📭 학사일정 변경 없음 ({len(fetched)}개월 확인)")
+        return []
+
+    # 이번에 수집하지 않은(또는 실패한) 달은 기존 내용 유지
+    merged = dict(existing)
+    merged.update(fetched)
+    kept_legacy = [] if convert_legacy else legacy_rows
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    total = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        # 변환 전 이전 형식 행은 기존 id(순번) 그대로
+        for i, item in enumerate(kept_legacy, start=1):
+            writer.writerow({"id": i, "date": item["date"], "content": item["content"]})
+            total += 1
+        for key in sorted(merged):
+            for i, item in enumerate(merged[key], start=1):
+                # 월별 id → 다른 달이 바뀌어도 이 달의 id와 청크 id는 그대로 유지
+                writer.writerow({
+                    "id": f"{key}-{i}",
+                    "date": item["date"],
+                    "content": item["content"]
+                })
+                total += 1
+
+    print(f"[✅] 학사일정 {total}건 저장 완료 → {path} (변경된 달: {', '.join(changed_months) or '형식 변환'})")
+    return changed_months
+
+if __name__ == "__main__":
+    current_year = date.today().year
+    parser = argparse.ArgumentParser(description="KNOU 학사일정 수집")
+    parser.add_argument("--start-year", type=int, default=current_year)
+    parser.add_argument("--end-year", type=int, default=None, help="마지막 연도 (기본: start-year)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
 
-print(f"[✅] 2025년 학사일정 {len(all_events)}건 저장 완료 → data/common_schedule.csv")
+    end_year = args.end_year or args.start_year
+    update_common_schedule(range(args.start_year, end_year + 1), max_workers=args.workers)
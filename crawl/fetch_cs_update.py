@@ -2,81 +2,79 @@
 
 import os
 import csv
-import time
+import argparse
 from datetime import datetime
-from playwright.sync_api import sync_playwright
+from crawl.crawler import Board, crawl_board, crawl_board_incremental, replace_csv_rows
 
 BASE_URL = "https://cs.knou.ac.kr"
 PAGE_URL_TEMPLATE = "https://cs.knou.ac.kr/cs1/4812/subview.do?page={}&enc=Zm5jdDF8QEB8JTJGYmJzJTJGY3MxJTJGMjExOSUyRmFydGNsTGlzdC5kbyUzRg%3D%3D"
 
 EXISTING_CSV = os.path.join("data", "cs_notices_2025.csv")
+# 전체 크롤링(EXISTING_CSV) 이후 새로 올라온 공지를 누적 저장하는 파일 (실행마다 덮어쓰는 변경분 파일이 아님)
+# 증분 모드는 기존 글만 있는 페이지에서 멈추므로, 이전 실행에서 찾은 글도 이 파일에 남겨둬야 청크 생성에 계속 포함됨
 UPDATE_CSV = os.path.join("data", "cs_notices_update.csv")
+FIELDNAMES = ["id", "title", "date", "content", "url"]
 
-def load_existing_ids():
-    if not os.path.exists(EXISTING_CSV):
-        return set()
-    with open(EXISTING_CSV, newline='', encoding='utf-8') as f:
-        return {row['id'] for row in csv.DictReader(f)}
-
-def crawl_new_cs_notices(existing_ids, max_page=3):
-    new_notices = []
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-
-        for page_num in range(1, max_page + 1):
-            print(f"🔍 컴공 갱신 확인 중... 페이지 {page_num}")
-            page.goto(PAGE_URL_TEMPLATE.format(page_num))
-            rows = page.locator("table.board-table tbody tr")
-
-            for i in range(rows.count()):
-                row = rows.nth(i)
-                dept = row.locator("td.td-write").inner_text().strip()
-                if dept != "컴퓨터과학과":
-                    continue
-
-                title_elem = row.locator("td.td-subject a")
-                title = title_elem.inner_text().strip()
-                link = title_elem.get_attribute("href")
-                full_url = BASE_URL + link
-                date = row.locator("td.td-date").inner_text().strip()
-                article_id = link.split("/")[-2] if link else "unknown"
-
-                if article_id in existing_ids:
-                    continue
-
-                page.goto(full_url)
-                content_elem = page.locator("div.view-con").first
-                content = content_elem.inner_text().strip() if content_elem.count() > 0 else "본문 없음"
+# 링크 형식: .../{게시글 ID}/artclView.do, 컴퓨터과학과 글만 수집
+BOARD = Board(BASE_URL, PAGE_URL_TEMPLATE, id_from_link=lambda link: link.split("/")[-2], dept="컴퓨터과학과")
 
-                new_notices.append({
-                    "id": article_id,
-                    "title": title,
-                    "date": date,
-                    "content": content,
-                    "url": full_url
-                })
+def load_rows(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
 
-                page.goto(PAGE_URL_TEMPLATE.format(page_num))
-                time.sleep(0.5)
-
-        browser.close()
-    return new_notices
+def load_existing_ids():
+    # 전체 크롤링 파일 + 이전 업데이트 파일에 있는 게시글 모두 기존 글로 취급
+    return {row['id'] for path in (EXISTING_CSV, UPDATE_CSV) for row in load_rows(path)}
+
+def crawl_new_cs_notices(existing_ids, max_page=3, incremental=True, state=None):
+    """신규 컴공 공지 수집 → (신규 공지 목록, 수정된 기존 공지 목록)
+
+    증분 모드: 전부 기존 ID인 목록 페이지에서 중단하고, 확인한 기존 공지는
+    ETag/Last-Modified 조건부 요청과 본문 해시로 수정 여부만 확인합니다.
+    """
+    print(f"🔍 컴공 갱신 확인 중... 최대 페이지 {max_page}")
+    if incremental:
+        return crawl_board_incremental(BOARD, existing_ids, max_page=max_page, state=state)
+    # 목록 페이지에서 처음 보는 게시글만 골라 상세 페이지를 동시에 수집
+    return crawl_board(BOARD, range(1, max_page + 1), skip_ids=existing_ids), []
+
+def save_new_notices(notices, updated=()):
+    """신규 공지 저장 + 수정된 기존 공지 교체 → 교체한 행 수"""
+    # 수정된 기존 공지는 원래 있던 파일의 행을 교체
+    replaced = 0
+    if updated:
+        replaced = sum(replace_csv_rows(path, list(updated), FIELDNAMES) for path in (EXISTING_CSV, UPDATE_CSV))
+        print(f"✏️ {replaced}건 수정된 공지 갱신 완료")
 
-def save_new_notices(notices):
     if not notices:
         print("📭 새로운 공지 없음")
-        return
+        return replaced
 
     os.makedirs("data", exist_ok=True)
-    notices.sort(key=lambda x: datetime.strptime(x["date"].replace('.', '-'), "%Y-%m-%d"), reverse=True)
+    # 이전 업데이트 파일의 공지도 유지 (증분 모드에서는 새 글만 수집되므로)
+    new_ids = {notice["id"] for notice in notices}
+    merged = notices + [row for row in load_rows(UPDATE_CSV) if row["id"] not in new_ids]
+    merged.sort(key=lambda x: datetime.strptime(x["date"].replace('.', '-'), "%Y-%m-%d"), reverse=True)
     with open(UPDATE_CSV, "w", newline='', encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["id", "title", "date", "content", "url"])
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         writer.writeheader()
-        writer.writerows(notices)
-    print(f"✅ {len(notices)}건 저장 완료: {UPDATE_CSV}")
+        writer.writerows(merged)
+    print(f"✅ {len(notices)}건 저장 완료: {UPDATE_CSV} (총 {len(merged)}건)")
+    return replaced
 
-if __name__ == "__main__":
+def update_cs_notices(max_page=3, incremental=True, state=None):
+    """신규/수정 컴공 공지 수집 후 CSV 반영 → {"new": 신규 건수, "updated": 수정 건수}"""
     existing_ids = load_existing_ids()
-    new_data = crawl_new_cs_notices(existing_ids, max_page=3)
-    save_new_notices(new_data)
+    new_data, updated_data = crawl_new_cs_notices(existing_ids, max_page=max_page, incremental=incremental, state=state)
+    replaced = save_new_notices(new_data, updated_data)
+    return {"new": len(new_data), "updated": replaced}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="컴퓨터과학과 공지사항 업데이트")
+    parser.add_argument("--max-page", type=int, default=3)
+    parser.add_argument("--full", action="store_true", help="증분 모드 없이 max-page까지 모두 확인")
+    args = parser.parse_args()
+
+    update_cs_notices(max_page=args.max_page, incremental=not args.full)
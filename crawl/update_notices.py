@@ -1,10 +1,15 @@
 import os
 import csv
-from playwright.sync_api import sync_playwright
+import argparse
+from crawl.crawler import Board, crawl_board, crawl_board_incremental, replace_csv_rows
 
 BASE_URL = "https://www.knou.ac.kr"
 PAGE_URL_TEMPLATE = "https://www.knou.ac.kr/bbs/knou/51/artclList.do?page={}"
 CSV_PATH = os.path.join("data", "notices_2025.csv")
+FIELDNAMES = ["id", "title", "date", "content", "url"]
+
+# 링크 형식: /bbs/knou/51/{게시글 ID}/artclView.do
+BOARD = Board(BASE_URL, PAGE_URL_TEMPLATE, id_from_link=lambda link: link.split("/")[4])
 
 def load_existing_ids():
     if not os.path.exists(CSV_PATH):
@@ -12,59 +17,45 @@ def load_existing_ids():
     with open(CSV_PATH, newline='', encoding='utf-8') as f:
         return {row['id'] for row in csv.DictReader(f)}
 
-def crawl_new_notices(existing_ids, max_page=3):
-    new_notices = []
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-
-        for page_num in range(1, max_page + 1):
-            print(f"🔍 갱신 확인 중... 페이지 {page_num}")
-            page.goto(PAGE_URL_TEMPLATE.format(page_num))
-            rows = page.locator("table.board-table tbody tr")
-
-            for i in range(rows.count()):
-                row = rows.nth(i)
-                title_elem = row.locator("td.td-subject a")
-                title = title_elem.inner_text().strip()
-                link = title_elem.get_attribute("href")
-                full_url = BASE_URL + link
-                date = row.locator("td.td-date").inner_text().strip()
-                article_id = link.split("/")[4] if link else "unknown"
-
-                if article_id in existing_ids:
-                    continue  # 이미 존재하면 스킵
-
-                page.goto(full_url)
-                content_elem = page.locator("div.view-con").first
-                content = content_elem.inner_text().strip() if content_elem.count() > 0 else "본문 없음"
-
-                new_notices.append({
-                    "id": article_id,
-                    "title": title,
-                    "date": date,
-                    "content": content,
-                    "url": full_url
-                })
+def crawl_new_notices(existing_ids, max_page=3, incremental=True, state=None):
+    """신규 공지 수집 → (신규 공지 목록, 수정된 기존 공지 목록)
 
-                page.goto(PAGE_URL_TEMPLATE.format(page_num))
-
-        browser.close()
-    return new_notices
+    증분 모드: 전부 기존 ID인 목록 페이지에서 중단하고, 확인한 기존 공지는
+    ETag/Last-Modified 조건부 요청과 본문 해시로 수정 여부만 확인합니다.
+    """
+    print(f"🔍 갱신 확인 중... 최대 페이지 {max_page}")
+    if incremental:
+        return crawl_board_incremental(BOARD, existing_ids, max_page=max_page, state=state)
+    # 목록 페이지에서 처음 보는 게시글만 골라 상세 페이지를 동시에 수집
+    return crawl_board(BOARD, range(1, max_page + 1), skip_ids=existing_ids), []
 
 def append_new_notices(new_data):
     os.makedirs("data", exist_ok=True)
     with open(CSV_PATH, "a", newline='', encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["id", "title", "date", "content", "url"])
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
         if f.tell() == 0:
             writer.writeheader()
         writer.writerows(new_data)
 
-if __name__ == "__main__":
+def update_notices(max_page=3, incremental=True, state=None):
+    """신규/수정 공지 수집 후 CSV 반영 → {"new": 신규 건수, "updated": 수정 건수}"""
     existing_ids = load_existing_ids()
-    new_data = crawl_new_notices(existing_ids, max_page=3)
+    new_data, updated_data = crawl_new_notices(existing_ids, max_page=max_page, incremental=incremental, state=state)
+    replaced = 0
+    if updated_data:
+        replaced = replace_csv_rows(CSV_PATH, updated_data, FIELDNAMES)
+        print(f"✏️ {replaced}건 수정된 공지사항 갱신 완료")
     if new_data:
         append_new_notices(new_data)
         print(f"✅ {len(new_data)}건 신규 공지사항 저장 완료")
     else:
         print("📭 새로운 공지 없음")
+    return {"new": len(new_data), "updated": replaced}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KNOU 일반 공지사항 업데이트")
+    parser.add_argument("--max-page", type=int, default=3)
+    parser.add_argument("--full", action="store_true", help="증분 모드 없이 max-page까지 모두 확인")
+    args = parser.parse_args()
+
+    update_notices(max_page=args.max_page, incremental=not args.full)
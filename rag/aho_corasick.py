@@ -0,0 +1,66 @@
+from collections import deque
+
+
+class PhraseMatcher:
+    """Aho-Corasick 다중 패턴 매처
+
+    여러 구문을 한 번에 자동자로 컴파일해 두고, 텍스트를 한 번만 훑어 포함된 구문을 모두 찾습니다.
+    (구문마다 `in`으로 검사하는 방식은 텍스트 길이 × 구문 수, 이 방식은 텍스트 길이에 비례)
+    """
+
+    def __init__(self, patterns):
+        # 중복/빈 문자열 제외, 입력 순서 유지 (patterns[i] ↔ find_indices 결과 i)
+        self.patterns = list(dict.fromkeys(pattern for pattern in patterns if pattern))
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]
+        for idx, pattern in enumerate(self.patterns):
+            self._insert(idx, pattern)
+        self._link()
+
+    def _insert(self, idx: int, pattern: str):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] += (idx,)
+
+    def _link(self):
+        """너비 우선으로 실패 링크 계산 + 실패 링크 쪽 출력(접미사로 끝나는 구문)을 합쳐 둠"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(ch, 0)
+                outputs[next_state] += outputs[fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def find_indices(self, text: str) -> set:
+        """텍스트에 포함된 구문 번호 집합 (겹치거나 서로 포함된 구문도 모두)"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
+
+    def find(self, text: str) -> set:
+        """텍스트에 포함된 구문 집합"""
+        return {self.patterns[idx] for idx in self.find_indices(text)}
@@ -0,0 +1,188 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+import numpy as np
+
+# ✅ 설정
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))  # 최대 저장 답변 수 (LRU)
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))  # 답변 유효 시간 (초)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # 유사 질문 판정 코사인 유사도
+REPLAY_CHUNK_SIZE = 40  # 캐시된 답변을 스트리밍으로 다시 보낼 때 조각 크기 (글자 수)
+
+# embed_chunks.py가 컬렉션을 바꿀 때마다 갱신하는 색인 버전 파일
+INDEX_VERSION_PATH = os.path.join("rag", "chroma_db", "index_version")
+
+
+def write_index_version(path: str = INDEX_VERSION_PATH) -> str:
+    """새 색인 버전 기록 → 실행 중인 서버의 답변 캐시가 다음 조회 때 비워짐"""
+    version = str(time.time_ns())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_index_version(path: str = INDEX_VERSION_PATH) -> str:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def normalize_query(query: str) -> str:
+    """대소문자, 문장부호, 공백 차이를 없앤 질문 키 ("2학기 등록금 납부 기간?" == "2학기  등록금 납부기간")"""
+    text = re.sub(r"[^\w]", " ", query.lower())
+    return "".join(text.split())
+
+
+def _numbers(query: str) -> tuple:
+    # 학기/월/일 같은 숫자가 다른 질문은 임베딩이 비슷해도 다른 질문으로 취급
+    return tuple(re.findall(r"\d+", query))
+
+
+class _Entry:
+    __slots__ = ("key", "numbers", "vector", "answer", "created_at")
+
+    def __init__(self, key, numbers, vector, answer, created_at):
+        self.key = key
+        self.numbers = numbers
+        self.vector = vector
+        self.answer = answer
+        self.created_at = created_at
+
+
+class AnswerCache:
+    """정규화한 질문 → 완성된 답변 캐시 (LRU + TTL, 날짜/색인 버전이 바뀌면 전체 무효화)
+
+    정확히 같은 질문 키가 없으면 질문 임베딩의 코사인 유사도가 임계값 이상인
+    가장 가까운 질문의 답변을 사용합니다.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY, version_path: str = INDEX_VERSION_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.version_path = version_path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # 답변은 "오늘" 기준으로 만들어지므로 날짜가 바뀌면 모두 무효
+        self._day = date.today()
+        self._version = read_index_version(version_path)
+        self._version_mtime = self._mtime()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _mtime(self) -> int:
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _check_validity(self):
+        """날짜 변경 또는 새 색인 버전이면 캐시 비우기 (lock 안에서 호출)"""
+        today = date.today()
+        mtime = self._mtime()
+        if mtime != self._version_mtime:
+            self._version_mtime = mtime
+            version = read_index_version(self.version_path)
+            if version != self._version:
+                self._version = version
+                if self.entries:
+                    print(f"🔄 색인 버전 변경 → 답변 캐시 {len(self.entries)}개 비움")
+                self.entries.clear()
+        if today != self._day:
+            self._day = today
+            self.entries.clear()
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.created_at > self.ttl
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, query: str, embed=None) -> Optional[str]:
+        """캐시된 답변 조회, 없으면 None
+
+        embed: 질문 → 임베딩 벡터 함수. 정확히 일치하는 키가 없고 저장된 답변이
+        있을 때만 호출합니다.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        with self.lock:
+            self._check_validity()
+            entry = self.entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+            if entry is not None:
+                del self.entries[key]
+            numbers = _numbers(query)
+            candidates = [
+                e for e in self.entries.values()
+                if e.vector is not None and e.numbers == numbers and not self._expired(e, now)
+            ]
+
+        if not candidates or embed is None:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        vector = self._unit_vector(embed(query))
+        best = None
+        if vector is not None:
+            scores = np.stack([e.vector for e in candidates]) @ vector
+            best_idx = int(np.argmax(scores))
+            if scores[best_idx] >= self.similarity:
+                best = candidates[best_idx]
+
+        with self.lock:
+            if best is not None and best.key in self.entries:
+                self.entries.move_to_end(best.key)
+                self.hits += 1
+                print(f"🧠 유사 질문 캐시 적중: '{query}' ≈ '{best.key}' ({float(scores[best_idx]):.3f})")
+                return best.answer
+            self.misses += 1
+        return None
+
+    def put(self, query: str, answer: str, embed=None):
+        """완성된 답변 저장 (embed가 있으면 유사 질문 조회용 임베딩도 함께 저장)"""
+        if not answer:
+            return
+        vector = self._unit_vector(embed(query)) if embed is not None else None
+        key = normalize_query(query)
+        with self.lock:
+            self._check_validity()
+            self.entries[key] = _Entry(key, _numbers(query), vector, answer, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    @staticmethod
+    def _unit_vector(embedding) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if not norm:
+            # 임베딩 실패 시 0 벡터가 올 수 있음 → 유사도 비교에서 제외
+            return None
+        return vector / norm
+
+
+def replay(answer: str, chunk_size: int = REPLAY_CHUNK_SIZE):
+    """캐시된 답변을 스트리밍 응답처럼 조각내어 전달"""
+    for i in range(0, len(answer), chunk_size):
+        yield answer[i:i + chunk_size]
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+KNOU 챗봇 검색 벤치마크
+
+rag/chunks.jsonl을 1×/10×/100× 크기(합성 공지 추가)로 임시 ChromaDB에 넣고,
+결정적 해시 임베딩과 고정 응답 생성 모델로 KNOUChatbot.search_documents의
+지연 시간 분위수, 처리량, 라벨링된 질문 세트의 recall@k를 측정합니다.
+기준값(rag/benchmark_baseline.json)보다 허용 범위 이상 나빠지면 종료 코드 1로 실패합니다.
+기준값에는 측정 환경(호스트, CPU, 라이브러리 버전)과 코퍼스/질문 세트 해시가 함께 저장되며,
+recall은 코퍼스와 설정이 같으면 비교하고, 지연 시간은 같은 환경에서 만든 기준값일 때만 비교합니다.
+
+사용법:
+    python rag/benchmark.py                      # 기준값과 비교
+    python rag/benchmark.py --scales 1,10        # 일부 크기만
+    python rag/benchmark.py --update-baseline    # 현재 결과를 기준값으로 저장
+    python rag/benchmark.py --baseline /tmp/ref.json --update-baseline  # 이 호스트의 기준 실행 따로 저장
+    python rag/benchmark.py --startup            # 챗봇 시작 시간 (스냅샷 없음/있음)
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import numpy as np
+import chromadb
+from chromadb import PersistentClient
+from chromadb import Documents, EmbeddingFunction, Embeddings
+import rag.date_index as date_index
+import rag.query_chat as query_chat
+from rag.corpus_store import CORPUS_STORE_FILE, CorpusStore
+from rag.expansion_cache import ExpansionCache
+from rag.index_snapshot import SNAPSHOT_FILE
+from rag.prepare_chunks import load_chunks
+from rag.vector_store import VECTOR_STORE_FILE, export_vectors
+
+# ✅ 설정
+CHUNKS_PATH = os.path.join("rag", "chunks.jsonl")
+QUESTIONS_PATH = os.path.join("rag", "benchmark_questions.json")
+BASELINE_PATH = os.path.join("rag", "benchmark_baseline.json")
+BENCH_TODAY = date(2025, 7, 20)  # 날짜 가중치가 실행 날짜에 따라 바뀌지 않도록 "오늘"을 고정
+EMBEDDING_DIM = 256
+ADD_BATCH_SIZE = 5000
+DEFAULT_SCALES = "1,10,100"
+LATENCY_TOLERANCE = 0.5  # p95 지연 시간이 기준값보다 50% 이상 느려지면 실패
+LATENCY_SLACK_MS = 10.0  # + 고정 여유 (수 ms 단위 측정에서는 스케줄링 잡음만으로 50%를 넘음)
+RECALL_TOLERANCE = 0.02  # recall@k가 기준값보다 0.02 이상 낮아지면 실패
+
+# 시작 시간 측정용 새 인터프리터에서 실행 (import 시간 포함, 운영과 같은 기본 임베딩/생성 모델 객체)
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import rag.query_chat as query_chat
+imported = time.perf_counter()
+chatbot = query_chat.KNOUChatbot(index_dir=sys.argv[1], vector_backend=sys.argv[2])
+ready = time.perf_counter()
+assert hasattr(chatbot, "corpus"), "색인 로드 실패"
+print(json.dumps({"import_s": imported - start, "init_s": ready - imported, "total_s": ready - start,
+                  "chromadb_loaded": "chromadb" in sys.modules}))
+"""
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """글자 bigram 해시 기반 결정적 임베딩 (API 호출 없음, 같은 입력 → 항상 같은 벡터)"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        compact = "".join(text.lower().split())
+        for i in range(len(compact) - 1):
+            vector[zlib.crc32(compact[i:i + 2].encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [self.embed(text).tolist() for text in input]
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGenerator:
+    """쿼리 확장에는 원본 질문 기반의 고정된 질문 3개, 답변 생성에는 고정 문장을 반환"""
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream:
+            return iter([_Response("벤치마크 "), _Response("답변")])
+        match = re.search(r'원본 질문: "(.*)"', prompt)
+        query = match.group(1) if match else ""
+        return _Response(f"1. {query} 안내\n2. {query} 일정\n3. {query} 신청 방법")
+
+
+class _FrozenDate(date):
+    @classmethod
+    def today(cls):
+        return cls(BENCH_TODAY.year, BENCH_TODAY.month, BENCH_TODAY.day)
+
+
+def freeze_today():
+    query_chat.date = _FrozenDate
+    date_index.date = _FrozenDate
+
+
+def synthetic_corpus(chunks: list, scale: int, embedder: HashEmbeddingFunction):
+    """원본 청크 + (scale-1)벌의 합성 공지 → (ids, 문서, 메타데이터, 임베딩)
+
+    합성 공지는 제목에 회차를 붙이고 날짜를 회차×7일 과거로 옮기며, 임베딩에는
+    회차별 고정 시드의 작은 잡음을 더해 서로 다른 문서가 되도록 합니다.
+    """
+    base_embeddings = np.stack([embedder.embed(chunk["text"]) for chunk in chunks])
+    for copy_no in range(scale):
+        ids, documents, metadatas = [], [], []
+        for chunk in chunks:
+            meta = {k: v for k, v in chunk.items() if k not in ("id", "text")}
+            text = chunk["text"]
+            if copy_no:
+                shifted = date.fromordinal(max(1, int(meta.get("date_ordinal") or BENCH_TODAY.toordinal()) - 7 * copy_no))
+                meta["title"] = f"{meta.get('title', '')} ({copy_no}차)"
+                meta["date"] = shifted.isoformat()
+                meta["date_ordinal"] = shifted.toordinal()
+                text = f"{text}\n({copy_no}차 안내)"
+            ids.append(chunk["id"] if not copy_no else f"{chunk['id']}-syn{copy_no}")
+            documents.append(text)
+            metadatas.append({k: v if isinstance(v, int) else str(v) for k, v in meta.items()})
+        embeddings = base_embeddings
+        if copy_no:
+            noise = np.random.default_rng(copy_no).normal(0, 0.05, base_embeddings.shape).astype(np.float32)
+            embeddings = base_embeddings + noise
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        yield ids, documents, metadatas, embeddings
+
+
+def build_index(chunks: list, scale: int, workdir: str, vector_backend: str = "chroma") -> tuple:
+    """합성 코퍼스를 임시 색인 디렉토리의 Chroma 컬렉션에 저장 → (클라이언트, 컬렉션, 색인 경로, 임베딩 함수)"""
+    embedder = HashEmbeddingFunction()
+    index_dir = os.path.join(workdir, f"chroma_{scale}x")
+    client = PersistentClient(path=index_dir)
+    collection = client.create_collection(name=query_chat.COLLECTION_NAME, embedding_function=embedder)
+    for ids, documents, metadatas, embeddings in synthetic_corpus(chunks, scale, embedder):
+        for i in range(0, len(ids), ADD_BATCH_SIZE):
+            collection.add(
+                ids=ids[i:i + ADD_BATCH_SIZE],
+                documents=documents[i:i + ADD_BATCH_SIZE],
+                metadatas=metadatas[i:i + ADD_BATCH_SIZE],
+                embeddings=embeddings[i:i + ADD_BATCH_SIZE].tolist()
+            )
+    if vector_backend == "local":
+        export_vectors(collection, os.path.join(index_dir, VECTOR_STORE_FILE))
+    return client, collection, index_dir, embedder
+
+
+def build_chatbot(chunks: list, scale: int, workdir: str, vector_backend: str = "chroma"):
+    client, _, index_dir, embedder = build_index(chunks, scale, workdir, vector_backend)
+    expansion_cache = ExpansionCache(path=os.path.join(workdir, f"expansion_{scale}x.sqlite3"), ttl=0)
+    expansion_cache.enabled = False  # 매 요청이 같은 확장 경로를 거치도록 캐시 사용 안 함
+    return query_chat.KNOUChatbot(
+        chroma_client=client, embedding_func=embedder,
+        gen_model=StubGenerator(), expansion_cache=expansion_cache,
+        index_dir=index_dir, vector_backend=vector_backend
+    )
+
+
+def recall_at_k(results, relevant: list, k: int) -> float:
+    titles = [meta.get("title", "") for meta in results["metadatas"][0][:k]] if results else []
+    found = sum(1 for pattern in relevant if any(pattern in title for title in titles))
+    return found / len(relevant)
+
+
+def percentile(values: list, q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_scale(chunks: list, questions: list, scale: int, args, workdir: str) -> dict:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        chatbot = build_chatbot(chunks, scale, workdir, args.vector_backend)
+    build_seconds = time.perf_counter() - start
+
+    def search(question):
+        started = time.perf_counter()
+        results = chatbot.search_documents(question, n_results=args.k)
+        return time.perf_counter() - started, results
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # 워밍업 겸 recall 측정 (결정적이므로 한 번이면 충분)
+        recalls = [recall_at_k(search(item["question"])[1], item["relevant"], args.k) for item in questions]
+
+        latencies = []
+        for _ in range(args.repeat):
+            for item in questions:
+                latencies.append(search(item["question"])[0])
+
+        workload = [item["question"] for item in questions] * args.repeat
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(search, workload))
+        throughput = len(workload) / (time.perf_counter() - started)
+
+    return {
+        "documents": len(chunks) * scale,
+        "build_s": round(build_seconds, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "qps": round(throughput, 2),
+        f"recall@{args.k}": round(sum(recalls) / len(recalls), 4),
+    }
+
+
+def measure_startup(index_dir: str, vector_backend: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, index_dir, vector_backend],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_startup(chunks: list, scale: int, args, workdir: str) -> dict:
+    """새 프로세스에서 챗봇 시작 시간 측정: 스냅샷 없음(키워드 색인 구축) / 스냅샷 있음"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, collection, index_dir, _ = build_index(chunks, scale, workdir, args.vector_backend)
+        data = collection.get(include=["documents", "metadatas"])
+        CorpusStore.from_collection_data(data['ids'], data['documents'], data['metadatas']).save(
+            os.path.join(index_dir, CORPUS_STORE_FILE))
+
+    snapshot_path = os.path.join(index_dir, SNAPSHOT_FILE)
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        cold.append(measure_startup(index_dir, args.vector_backend))  # 구축 후 스냅샷 저장
+        warm.append(measure_startup(index_dir, args.vector_backend))
+
+    def median(runs: list, key: str) -> float:
+        return round(float(np.median([run[key] for run in runs])), 3)
+
+    return {
+        "documents": len(chunks) * scale,
+        "import_s": median(warm, "import_s"),
+        "cold_init_s": median(cold, "init_s"),
+        "warm_init_s": median(warm, "init_s"),
+        "cold_total_s": median(cold, "total_s"),
+        "warm_total_s": median(warm, "total_s"),
+        "chromadb_loaded": warm[-1]["chromadb_loaded"],
+    }
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+def run_metadata(args, chunks: list, questions: list) -> dict:
+    """기준값과 함께 저장하는 측정 조건 (환경이 다르면 지연 시간, 코퍼스/설정이 다르면 recall도 비교 불가)"""
+    return {
+        "environment": {
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "chromadb": chromadb.__version__,
+            "numpy": np.__version__,
+        },
+        "corpus": {
+            "chunks": len(chunks),
+            "chunks_hash": file_hash(CHUNKS_PATH),
+            "questions": len(questions),
+            "questions_hash": file_hash(QUESTIONS_PATH),
+            "today": BENCH_TODAY.isoformat(),
+            "embedding_dim": EMBEDDING_DIM,
+        },
+        "settings": {"vector_backend": args.vector_backend, "k": args.k,
+                     "repeat": args.repeat, "concurrency": args.concurrency},
+    }
+
+
+def load_baseline(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    # 측정 조건 없이 배수별 결과만 저장하던 이전 형식 → 조건을 알 수 없으므로 지연 시간은 비교하지 않음
+    return baseline if "results" in baseline else {"results": baseline}
+
+
+def comparable(baseline: dict, metadata: dict) -> tuple:
+    """(recall 비교 가능 여부, 지연 시간 비교 가능 여부)"""
+    base_settings, settings = baseline.get("settings", {}), metadata["settings"]
+    same_search = (baseline.get("corpus") == metadata["corpus"]
+                   and all(base_settings.get(key) == settings[key] for key in ("vector_backend", "k")))
+    if "corpus" not in baseline:
+        same_search = True  # 이전 형식: 같은 코퍼스라고 가정하고 recall만 비교
+    same_host = same_search and baseline.get("environment") == metadata["environment"] and base_settings == settings
+    return same_search, same_host
+
+
+def compare(results: dict, baseline: dict, k: int, latency: bool = True) -> list:
+    """기준값 대비 회귀 목록 (latency=False면 recall만 비교)"""
+    regressions = []
+    recall_key = f"recall@{k}"
+    for scale, current in results.items():
+        base = baseline["results"].get(scale)
+        if not base:
+            continue
+        if latency and current["p95_ms"] > base["p95_ms"] * (1 + LATENCY_TOLERANCE) + LATENCY_SLACK_MS:
+            regressions.append(f"{scale}: p95 {current['p95_ms']}ms > 기준 {base['p95_ms']}ms × {1 + LATENCY_TOLERANCE}"
+                               f" + {LATENCY_SLACK_MS}ms")
+        if recall_key in base and current[recall_key] < base[recall_key] - RECALL_TOLERANCE:
+            regressions.append(f"{scale}: {recall_key} {current[recall_key]} < 기준 {base[recall_key]} - {RECALL_TOLERANCE}")
+    return regressions
+
+
+def main():
+    # Chroma 내부의 문자열 set 순서(→ HNSW 삽입 순서, 동일 거리 문서 순서)가 해시 시드에 따라
+    # 달라지므로, 결과 재현을 위해 해시 시드를 고정해 다시 실행
+    if os.environ.get("PYTHONHASHSEED") != "0":
+        os.environ["PYTHONHASHSEED"] = "0"
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    parser = argparse.ArgumentParser(description="KNOU 챗봇 검색 벤치마크")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="코퍼스 배수 목록 (예: 1,10,100)")
+    parser.add_argument("--repeat", type=int, default=3, help="질문 세트 반복 횟수")
+    parser.add_argument("--concurrency", type=int, default=4, help="처리량 측정 시 동시 요청 수")
+    parser.add_argument("-k", type=int, default=5, help="recall@k의 k (= n_results)")
+    parser.add_argument("--vector-backend", choices=["chroma", "local"], default="chroma", help="벡터 검색 방식")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="현재 결과를 기준값으로 저장")
+    parser.add_argument("--startup", action="store_true", help="검색 대신 챗봇 시작 시간 측정 (기준값 비교 없음)")
+    args = parser.parse_args()
+
+    freeze_today()
+    chunks = load_chunks(CHUNKS_PATH)
+    with open(QUESTIONS_PATH, encoding="utf-8") as f:
+        questions = json.load(f)
+    metadata = run_metadata(args, chunks, questions)
+    scales = [int(scale) for scale in args.scales.split(",") if scale.strip()]
+    print(f"📊 벤치마크: 청크 {len(chunks)}개, 질문 {len(questions)}개, 배수 {scales}, 기준일 {BENCH_TODAY}, 벡터 검색 {args.vector_backend}")
+
+    if args.startup:
+        with tempfile.TemporaryDirectory(prefix="knou_bench_") as workdir:
+            for scale in scales:
+                print(f"⏳ {scale}× 시작 시간 측정 중...")
+                print(f"   {json.dumps(run_startup(chunks, scale, args, workdir), ensure_ascii=False)}")
+        return 0
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="knou_bench_") as workdir:
+        for scale in scales:
+            print(f"⏳ {scale}× 측정 중...")
+            results[f"{scale}x"] = result = run_scale(chunks, questions, scale, args, workdir)
+            print(f"   {json.dumps(result, ensure_ascii=False)}")
+
+    if args.update_baseline:
+        results_by_scale = {}
+        if os.path.exists(args.baseline):
+            baseline = load_baseline(args.baseline)
+            # 같은 조건에서 일부 배수만 다시 측정한 경우 나머지 배수의 기준값은 유지
+            if all(comparable(baseline, metadata)):
+                results_by_scale = baseline["results"]
+        results_by_scale.update(results)
+        baseline = {**metadata, "created": datetime.now().isoformat(timespec="seconds"), "results": results_by_scale}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"💾 기준값 저장: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️ 기준값 파일이 없습니다 ({args.baseline}). --update-baseline으로 먼저 생성하세요.")
+        return 0
+    baseline = load_baseline(args.baseline)
+
+    same_search, same_host = comparable(baseline, metadata)
+    if not same_search:
+        print("⚠️ 기준값과 코퍼스/질문 세트/검색 설정이 달라 비교하지 않습니다. --update-baseline으로 기준값을 다시 만드세요.")
+        return 0
+    if not same_host:
+        environment = baseline.get("environment", {})
+        print(f"⚠️ 기준값이 다른 환경({environment.get('host', '알 수 없음')}, CPU {environment.get('cpus', '?')}개)"
+              f"이나 측정 설정에서 만들어져 지연 시간은 비교하지 않고 recall만 비교합니다.")
+        print("   지연 시간 회귀는 같은 호스트의 기준 실행과 비교하세요: --baseline <경로> --update-baseline 후 --baseline <경로>")
+
+    regressions = compare(results, baseline, args.k, latency=same_host)
+    if regressions:
+        print("❌ 성능 회귀 감지:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print("✅ 기준값 대비 회귀 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
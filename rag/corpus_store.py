@@ -0,0 +1,225 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# ✅ 설정
+CORPUS_STORE_FILE = "corpus.bin"
+# prepare_chunks.py가 쓰는 위치 (벡터 DB와 같은 볼륨 → 컨테이너 재시작 후에도 유지)
+# embed_chunks.py가 새 색인 세대에 복사하고, 챗봇은 세대 디렉토리의 파일을 읽음
+CORPUS_STORE_PATH = os.getenv("CORPUS_STORE_PATH", os.path.join("rag", "chroma_db", CORPUS_STORE_FILE))
+
+MAGIC = b"KNOUCORPUS1\n"
+# 반복되는 값이 많은 문자열 메타데이터 → 고유 값 목록 + 정수 번호 배열로 저장
+STRING_FIELDS = ("title", "type", "source", "date", "article_id", "revision")
+INT_FIELDS = ("date_ordinal",)
+MISSING = -1  # 해당 메타데이터 필드가 없는 청크
+ALIGNMENT = 8  # 배열 구역 시작 위치 정렬 (메모리 매핑한 파일을 복사 없이 정수 배열로 읽기 위함)
+
+
+def write_mapped_file(path: str, magic: bytes, header: dict, sections: list, buffers=()):
+    """[magic][헤더 길이][JSON 헤더][정렬된 배열 구역들][바이트 버퍼들] 형식으로 원자적 저장
+
+    sections: [(이름, array 또는 memoryview)], 헤더에는 byteorder와 구역 목록이 추가됩니다.
+    """
+    header = dict(header, byteorder=sys.byteorder, sections=[
+        [name, getattr(values, "typecode", None) or values.format, len(values)] for name, values in sections
+    ])
+    header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    # 헤더 뒤를 공백으로 채워 배열 구역이 ALIGNMENT 배수 위치에서 시작하도록 함 (JSON으로는 동일)
+    header += b" " * (-(len(magic) + 8 + len(header)) % ALIGNMENT)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for _, values in sections:
+            f.write(values)
+        for buffer in buffers:
+            f.write(buffer)
+    os.replace(tmp_path, path)
+
+
+def read_mapped_file(path: str, magic: bytes) -> tuple:
+    """write_mapped_file 형식 파일을 메모리 매핑 → (헤더, {구역 이름: 배열}, 파일 memoryview, 버퍼 시작 위치)
+
+    바이트 순서가 같고 정렬된 구역은 매핑된 파일을 복사 없이 정수 배열(memoryview)로 사용합니다.
+    """
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(magic)] != magic:
+        raise ValueError(f"파일 형식이 다릅니다: {path}")
+    offset = len(magic)
+    (header_length,) = struct.unpack_from("<Q", data, offset)
+    offset += 8
+    header = json.loads(data[offset:offset + header_length].decode("utf-8"))
+    offset += header_length
+
+    view = memoryview(data)
+    arrays = {}
+    for name, typecode, length in header["sections"]:
+        size = array(typecode).itemsize * length
+        if header["byteorder"] == sys.byteorder and offset % ALIGNMENT == 0:
+            values = view[offset:offset + size].cast(typecode)
+        else:
+            # 정렬되지 않은 이전 형식이거나 바이트 순서가 다른 파일 → 복사해서 변환
+            values = array(typecode)
+            values.frombytes(view[offset:offset + size])
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+        arrays[name] = values
+        offset += size
+    return header, arrays, view, offset
+
+
+class CorpusStore:
+    """청크 id/본문/메타데이터 열 단위 저장소 (검색 결과 구성용, 읽기 전용)
+
+    - 본문과 id: 하나의 UTF-8 버퍼 + 바이트 오프셋 배열 (요청 시 필요한 문서만 디코딩)
+    - 제목/타입/출처/날짜 문자열: 고유 값 목록(intern) + 번호 배열
+    - date_ordinal: 정수 배열
+
+    rag/prepare_chunks.py가 저장하고, 챗봇은 색인 세대를 불러올 때 한 번만 읽습니다.
+    load()는 파일을 메모리 매핑하므로 여러 워커 프로세스가 페이지 캐시의 한 사본을 공유합니다.
+    """
+
+    def __init__(self):
+        self.text = b""
+        self.text_offsets = array('q', [0])
+        self.id_buffer = b""
+        self.id_offsets = array('q', [0])
+        self.values = {field: [] for field in STRING_FIELDS}  # field → 고유 값 목록
+        self.codes = {field: array('i') for field in STRING_FIELDS}  # field → 청크별 값 번호
+        self.ints = {field: array('i') for field in INT_FIELDS}
+        self.positions = {}  # id → 위치
+        self.path = None  # load()로 불러온 파일 경로 (색인 스냅샷이 같은 코퍼스인지 확인용)
+
+    @classmethod
+    def from_chunks(cls, chunks) -> "CorpusStore":
+        """청크 dict 스트림(chunks.jsonl 형식)으로 구축"""
+        store = cls()
+        texts, ids = bytearray(), bytearray()
+        lookups = {field: {} for field in STRING_FIELDS}
+        for chunk in chunks:
+            pos = len(store.text_offsets) - 1
+            texts += (chunk.get("text") or "").encode("utf-8")
+            ids += chunk["id"].encode("utf-8")
+            store.text_offsets.append(len(texts))
+            store.id_offsets.append(len(ids))
+            store.positions[chunk["id"]] = pos
+            for field in STRING_FIELDS:
+                if field not in chunk:
+                    store.codes[field].append(MISSING)
+                    continue
+                # Chroma 메타데이터와 같은 형식 (정수 외 값은 문자열로 저장됨)
+                value = chunk[field] if isinstance(chunk[field], int) else str(chunk[field])
+                code = lookups[field].get(value)
+                if code is None:
+                    code = lookups[field][value] = len(store.values[field])
+                    store.values[field].append(value)
+                store.codes[field].append(code)
+            for field in INT_FIELDS:
+                try:
+                    store.ints[field].append(int(chunk.get(field) or 0))
+                except (TypeError, ValueError):
+                    store.ints[field].append(0)
+        store.text = bytes(texts)
+        store.id_buffer = bytes(ids)
+        return store
+
+    @classmethod
+    def from_collection_data(cls, ids: list, documents: list, metadatas: list) -> "CorpusStore":
+        """Chroma collection.get 결과로 구축 (corpus.bin이 없거나 컬렉션과 다를 때)"""
+        def chunks():
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                yield {**(metadata or {}), "id": doc_id, "text": document}
+        return cls.from_chunks(chunks())
+
+    def _sections(self):
+        yield "text_offsets", self.text_offsets
+        yield "id_offsets", self.id_offsets
+        for field in STRING_FIELDS:
+            yield f"codes.{field}", self.codes[field]
+        for field in INT_FIELDS:
+            yield f"ints.{field}", self.ints[field]
+
+    def save(self, path: str = CORPUS_STORE_PATH):
+        """[MAGIC][헤더 길이][JSON 헤더][배열들][본문 버퍼][id 버퍼] 형식으로 원자적 저장"""
+        write_mapped_file(path, MAGIC, {
+            "count": len(self),
+            "values": self.values,
+            "text_bytes": len(self.text),
+            "id_bytes": len(self.id_buffer),
+        }, list(self._sections()), (self.text, self.id_buffer))
+
+    @classmethod
+    def load(cls, path: str = CORPUS_STORE_PATH) -> "CorpusStore":
+        header, arrays, view, offset = read_mapped_file(path, MAGIC)
+        store = cls()
+        store.path = path
+        store.values = {field: header["values"].get(field, []) for field in STRING_FIELDS}
+        store.text = view[offset:offset + header["text_bytes"]]
+        offset += header["text_bytes"]
+        store.id_buffer = view[offset:offset + header["id_bytes"]]
+
+        store.text_offsets = arrays["text_offsets"]
+        store.id_offsets = arrays["id_offsets"]
+        for field in STRING_FIELDS:
+            store.codes[field] = arrays.get(f"codes.{field}") or array('i', [MISSING]) * header["count"]
+        for field in INT_FIELDS:
+            store.ints[field] = arrays.get(f"ints.{field}") or array('i', [0]) * header["count"]
+        store.positions = {store.id_of(pos): pos for pos in range(header["count"])}
+        return store
+
+    def __len__(self):
+        return len(self.text_offsets) - 1
+
+    def id_of(self, pos: int) -> str:
+        return str(self.id_buffer[self.id_offsets[pos]:self.id_offsets[pos + 1]], "utf-8")
+
+    def ids(self) -> list:
+        return [self.id_of(pos) for pos in range(len(self))]
+
+    def document(self, pos: int) -> str:
+        return str(self.text[self.text_offsets[pos]:self.text_offsets[pos + 1]], "utf-8")
+
+    def field(self, field: str, pos: int, default=None):
+        code = self.codes[field][pos]
+        return default if code == MISSING else self.values[field][code]
+
+    def ordinal(self, pos: int) -> int:
+        return self.ints["date_ordinal"][pos]
+
+    def metadata(self, pos: int) -> dict:
+        """Chroma 메타데이터와 같은 형식의 dict (요청 결과에 포함될 문서만 생성)"""
+        meta = {}
+        for field in STRING_FIELDS:
+            code = self.codes[field][pos]
+            if code != MISSING:
+                meta[field] = self.values[field][code]
+        meta["date_ordinal"] = self.ordinal(pos)
+        return meta
+
+    def position(self, doc_id: str):
+        return self.positions.get(doc_id)
+
+    def get(self, ids: list) -> dict:
+        """collection.get(ids=...)과 같은 형식 (저장소에 없는 id는 제외)"""
+        positions = [pos for pos in map(self.position, ids) if pos is not None]
+        return {
+            'ids': [self.id_of(pos) for pos in positions],
+            'documents': [self.document(pos) for pos in positions],
+            'metadatas': [self.metadata(pos) for pos in positions]
+        }
+
+    def results(self, positions: list) -> dict:
+        """문서 위치 목록 → Chroma 검색 결과 형식"""
+        return {
+            'ids': [[self.id_of(pos) for pos in positions]],
+            'documents': [[self.document(pos) for pos in positions]],
+            'metadatas': [[self.metadata(pos) for pos in positions]]
+        }
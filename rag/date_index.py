@@ -0,0 +1,165 @@
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Optional
+
+DATE_FORMATS = [
+    "%Y-%m-%d",      # 2025-07-16
+    "%Y.%m.%d",      # 2025.07.16
+    "%Y/%m/%d",      # 2025/07/16
+]
+
+
+def _guess_year(month: int, day: int, today: date) -> date:
+    """연도가 없는 날짜(07.25)는 오늘 기준 6개월 이내가 되도록 연도 추정"""
+    current_year = today.year
+    try:
+        candidate_date = date(current_year, month, day)
+        # 현재 날짜와의 차이가 6개월 이내면 현재 연도 사용
+        days_diff = abs((today - candidate_date).days)
+        if days_diff <= 180:  # 6개월
+            return candidate_date
+        # 미래 날짜가 너무 멀면 작년
+        elif candidate_date > today:
+            return date(current_year - 1, month, day)
+        # 과거 날짜가 너무 멀면 내년
+        else:
+            return date(current_year + 1, month, day)
+    except ValueError:
+        return date(current_year, month, day)
+
+
+def _date_part(date_str: str) -> str:
+    # Handle ranges, use start date
+    if "~" in date_str:
+        return date_str.split("~")[0].strip()
+    return date_str
+
+
+def yearless_month_day(date_str: str) -> Optional[tuple]:
+    """연도 없는 날짜(07.25, 07/25, 범위는 시작일) → (월, 일), 연도가 있거나 날짜가 아니면 None"""
+    if not date_str:
+        return None
+    date_str = _date_part(date_str)
+    for sep in ('.', '/'):
+        parts = date_str.split(sep)
+        if len(parts) == 2:
+            try:
+                month, day = map(int, parts)
+                date(2000, month, day)  # 윤년 기준으로 존재하는 날짜인지만 확인
+            except (ValueError, TypeError):
+                return None
+            return month, day
+    return None
+
+
+def resolve_yearless(month: int, day: int, today: Optional[date] = None) -> Optional[date]:
+    """연도 없는 날짜를 오늘 기준으로 해석 (2월 29일처럼 추정한 해에 없는 날짜는 None)"""
+    try:
+        return _guess_year(month, day, today or date.today())
+    except ValueError:
+        return None
+
+
+def parse_date_string(date_str: str, today: Optional[date] = None) -> Optional[date]:
+    """다양한 날짜 문자열을 date 객체로 변환 (범위는 시작일 사용)"""
+    if not date_str:
+        return None
+
+    date_str = _date_part(date_str)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+
+    # Try partial formats (e.g., "07.25", "07/25")
+    month_day = yearless_month_day(date_str)
+    if month_day:
+        return resolve_yearless(*month_day, today)
+    return None
+
+
+def date_to_ordinal(date_str: str) -> int:
+    """청크 메타데이터용 정수 날짜 (연도 없는 날짜/파싱 실패 시 0)
+
+    연도 없는 날짜는 청크 생성 시점 기준으로 연도를 고정하지 않고 0으로 두어,
+    DateIndex가 조회 시점의 오늘 기준으로 연도를 추정합니다.
+    """
+    if yearless_month_day(date_str):
+        return 0
+    parsed = parse_date_string(date_str)
+    return parsed.toordinal() if parsed else 0
+
+
+class DateIndex:
+    """문서 날짜(ordinal) 정렬 배열 - 기간/특정일/최소·최대 날짜를 bisect로 조회
+
+    ordinals: 문서별 연도가 있는 날짜 ordinal (없으면 0)
+    yearless: {문서 위치: (월, 일)} 연도 없는 날짜 → 조회하는 날의 오늘 기준으로 연도를 추정해
+    연도 있는 날짜와 합친 정렬 배열을 날짜가 바뀔 때마다 다시 만듦 (장기 실행 서버도 연말/연초에 맞게 해석)
+    """
+
+    def __init__(self, ordinals: list, yearless: Optional[dict] = None):
+        self.doc_ordinals = array('i', ordinals)
+        self.yearless = yearless or {}
+        # (ordinal, 문서 위치) 를 날짜순으로 정렬, 날짜 없는 문서(0)는 제외
+        pairs = sorted((ordinal, pos) for pos, ordinal in enumerate(ordinals) if ordinal > 0 and pos not in self.yearless)
+        self._fixed = ([ordinal for ordinal, _ in pairs], [pos for _, pos in pairs])
+        self._view = None
+
+    def _current(self) -> tuple:
+        """(기준일, 정렬된 ordinal, 문서 위치, 연도 없는 문서의 ordinal, 서로 다른 날짜 수)"""
+        today = date.today() if self.yearless else None
+        view = self._view
+        if view is None or view[0] != today:
+            resolved = {}
+            for pos, (month, day) in self.yearless.items():
+                guessed = resolve_yearless(month, day, today)
+                if guessed:
+                    resolved[pos] = guessed.toordinal()
+            merged = list(heapq.merge(zip(*self._fixed), sorted((ordinal, pos) for pos, ordinal in resolved.items())))
+            ordinals = [ordinal for ordinal, _ in merged]
+            view = (today, ordinals, [pos for _, pos in merged], resolved, len(set(ordinals)))
+            self._view = view
+        return view
+
+    @property
+    def ordinals(self) -> list:
+        return self._current()[1]
+
+    @property
+    def positions(self) -> list:
+        return self._current()[2]
+
+    @property
+    def distinct_count(self) -> int:
+        return self._current()[4]
+
+    def __len__(self):
+        return len(self._current()[1])
+
+    def ordinal_of(self, pos: int) -> int:
+        if pos in self.yearless:
+            return self._current()[3].get(pos, 0)
+        return self.doc_ordinals[pos]
+
+    def between(self, start: Optional[date] = None, end: Optional[date] = None) -> list:
+        """start <= 날짜 <= end 인 문서 위치 목록 (날짜 오름차순)"""
+        _, ordinals, positions, _, _ = self._current()
+        lo = bisect_left(ordinals, start.toordinal()) if start else 0
+        hi = bisect_right(ordinals, end.toordinal()) if end else len(ordinals)
+        return positions[lo:hi]
+
+    def on(self, day: date) -> list:
+        """날짜가 정확히 일치하는 문서 위치 목록"""
+        return self.between(day, day)
+
+    def oldest(self) -> Optional[date]:
+        ordinals = self.ordinals
+        return date.fromordinal(ordinals[0]) if ordinals else None
+
+    def latest(self) -> Optional[date]:
+        ordinals = self.ordinals
+        return date.fromordinal(ordinals[-1]) if ordinals else None
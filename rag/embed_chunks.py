@@ -1,9 +1,21 @@
-import json
 import os
+import random
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from chromadb import PersistentClient
 from chromadb import Documents, EmbeddingFunction, Embeddings
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
+from rag.answer_cache import write_index_version
+from rag.corpus_store import CORPUS_STORE_FILE, CORPUS_STORE_PATH
+from rag.index_generations import create_generation, current_index_dir, discard_generation, publish_generation
+from rag.index_snapshot import write_snapshot
+from rag.prepare_chunks import load_chunks
+from rag.vector_store import VECTOR_STORE_FILE, export_vectors
 
 load_dotenv()
 
@@ -11,107 +23,222 @@ load_dotenv()
 CHROMA_DIR = "rag/chroma_db"
 COLLECTION_NAME = "knou_chunks"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# 로컬 가짜 임베딩 서버로 테스트할 때만 지정 (예: http://127.0.0.1:8765)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))  # batchEmbedContents 요청당 최대 100개
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))  # 동시에 진행하는 배치 요청 수
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_SECONDS = 1.0
+DELETE_BATCH_SIZE = 500
+
+# 재시도할 오류: 요청 한도 초과(429) 및 일시적인 서버 오류
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
 
 # API 키 전역 설정
-genai.configure(api_key=GEMINI_API_KEY)
+if GEMINI_API_ENDPOINT:
+    genai.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+else:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+
+class EmbeddingError(Exception):
+    """재시도 후에도 임베딩을 만들지 못한 경우 (0 벡터로 대체하지 않고 실패 처리)"""
+
+
+class BatchEmbedder:
+    """배치 단위 임베딩 요청 + 배치 간 동시 실행 제한 + 요청 한도 초과 시 지수 백오프 재시도"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, batch_size: int = EMBED_BATCH_SIZE,
+                 max_concurrency: int = EMBED_MAX_CONCURRENCY, max_retries: int = EMBED_MAX_RETRIES,
+                 backoff_seconds: float = EMBED_BACKOFF_SECONDS, task_type: Optional[str] = None):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.task_type = task_type
+
+    def _embed_batch(self, texts: list) -> list:
+        """한 배치를 한 번의 API 호출로 임베딩 (재시도 포함)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = genai.embed_content(
+                    model=self.model,
+                    content=list(texts),
+                    task_type=self.task_type
+                )
+                embeddings = result['embedding']
+                if len(embeddings) != len(texts):
+                    raise EmbeddingError(f"임베딩 개수 불일치: 요청 {len(texts)}개, 응답 {len(embeddings)}개")
+                return embeddings
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise EmbeddingError(f"{self.max_retries}회 재시도 후 임베딩 실패: {e}") from e
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                print(f"⏳ 임베딩 요청 제한/일시 오류, {delay:.1f}초 후 재시도 ({attempt + 1}/{self.max_retries}): {e}")
+                time.sleep(delay)
+
+    def split(self, items: list) -> list:
+        return [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+    def embed_batches(self, batches):
+        """배치 목록을 순서대로 임베딩 (동시에 최대 max_concurrency개 요청 진행)"""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(self._embed_batch, batch))
+                if len(pending) >= self.max_concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def embed(self, texts: list) -> list:
+        embeddings = []
+        for batch_embeddings in self.embed_batches(self.split(texts)):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
 
 # ✅ Gemini 임베딩 함수 (최신 API 방식)
 class GeminiEmbeddingFunction(EmbeddingFunction):
     def __init__(self):
-        self.model = "models/text-embedding-004"
+        self.model = EMBEDDING_MODEL
+        self.embedder = BatchEmbedder(model=self.model)
     
     def __call__(self, input: Documents) -> Embeddings:
-        try:
-            # 배치 임베딩 요청
-            embeddings = []
-            for text in input:
-                result = genai.embed_content(
-                    model=self.model,
-                    content=text
-                )
-                embeddings.append(result['embedding'])
-            return embeddings
-        except Exception as e:
-            print(f"❌ 임베딩 생성 실패: {e}")
-            # 빈 임베딩 반환 (ChromaDB 오류 방지)
-            return [[0.0] * 768 for _ in input]
-
-def load_chunks():
-    chunks = []
-    with open("rag/chunks.jsonl", "r", encoding="utf-8") as f:
-        for line in f:
-            chunks.append(json.loads(line.strip()))
-    return chunks
-
-def main():
-    print("🔧 Gemini 임베딩 함수 초기화 중...")
-    
-    # API 키 확인
-    if not GEMINI_API_KEY or GEMINI_API_KEY == "your_api_key_here":
-        print("❌ GEMINI_API_KEY가 설정되지 않았습니다!")
-        exit(1)
-    
-    print("🔑 API 키 확인: ✅ 설정됨")
-    
-    # ✅ 이미 있는 ID 확인해서 중복 방지 (올바른 방식)
-    embedding_func = GeminiEmbeddingFunction()
-    client = PersistentClient(path=CHROMA_DIR)
-    
+        # 실패 시 0 벡터를 저장하지 않고 예외를 그대로 전달
+        return self.embedder.embed(list(input))
+
+def save_vector_export(collection, index_dir):
+    path = os.path.join(index_dir, VECTOR_STORE_FILE)
+    start = time.perf_counter()
+    count = export_vectors(collection, path)
+    print(f"🧮 벡터 파일 저장: {path} ({count}개, {time.perf_counter() - start:.1f}초)")
+
+def open_collection(index_dir, embedding_func):
+    """색인 디렉토리의 컬렉션 (없으면 새로 생성) → (컬렉션, 기존 ID 집합)"""
+    client = PersistentClient(path=index_dir)
     try:
         collection = client.get_collection(
             name=COLLECTION_NAME,
             embedding_function=embedding_func
         )
-        existing_ids = set(collection.get()["ids"])
-        print(f"📋 기존 청크 {len(existing_ids)}개 발견")
+        return collection, set(collection.get(include=[])["ids"])
     except Exception:
         collection = client.create_collection(
             name=COLLECTION_NAME,
             embedding_function=embedding_func
         )
-        existing_ids = set()
-        print("📝 새 컬렉션 생성")
+        return collection, set()
+
+def apply_changes(collection, embedding_func, new_chunks, removed_ids):
+    print(f"🎯 신규 청크 {len(new_chunks)}개 임베딩 중...")
+
+    # 배치로 임베딩 및 추가 (임베딩을 직접 계산해 전달, 배치 간 동시 요청)
+    embedder = embedding_func.embedder
+    batches = embedder.split(new_chunks)
+    text_batches = ([chunk["text"] for chunk in batch] for batch in batches)
+    for batch_no, (batch, embeddings) in enumerate(zip(batches, embedder.embed_batches(text_batches)), start=1):
+        # 메타데이터와 문서 분리 (date_ordinal 같은 정수 필드는 그대로 유지)
+        metadatas = [
+            {k: v if isinstance(v, int) else str(v) for k, v in chunk.items() if k not in ["text", "id"]}
+            for chunk in batch
+        ]
+        
+        print(f"🔄 배치 {batch_no}/{len(batches)} 저장 중... ({len(batch)}개)")
+        
+        collection.add(
+            documents=[chunk["text"] for chunk in batch],
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=[chunk["id"] for chunk in batch]
+        )
+    
+    print("✅ 모든 청크 임베딩 완료!")
+    
+    # 신규 청크 추가 후, 더 이상 존재하지 않는(내용이 바뀌었거나 삭제된) 청크 제거
+    if removed_ids:
+        print(f"🗑️ 삭제된 청크 {len(removed_ids)}개 제거 중...")
+        for i in range(0, len(removed_ids), DELETE_BATCH_SIZE):
+            collection.delete(ids=removed_ids[i:i+DELETE_BATCH_SIZE])
+
+def main() -> dict:
+    """현재 색인 세대 대비 신규/삭제 청크 반영 → {"added", "removed", "total"} (변경 없으면 added/removed 0)"""
+    print("🔧 Gemini 임베딩 함수 초기화 중...")
+    
+    # API 키 확인
+    if not GEMINI_API_KEY or GEMINI_API_KEY == "your_api_key_here":
+        print("❌ GEMINI_API_KEY가 설정되지 않았습니다!")
+        exit(1)
+    
+    print("🔑 API 키 확인: ✅ 설정됨")
+    
+    # ✅ 현재(서버가 사용 중인) 색인 세대의 ID 확인 → 신규/삭제 판별 (읽기만 함)
+    embedding_func = GeminiEmbeddingFunction()
+    live_dir = current_index_dir(CHROMA_DIR)
+    live_collection, existing_ids = open_collection(live_dir, embedding_func)
+    print(f"📋 현재 색인({live_dir}) 청크 {len(existing_ids)}개 발견")
 
     # 청크 로드
     print("📄 청크 로드 중...")
     chunks = load_chunks()
     print(f"📄 총 청크 {len(chunks)}개 로드됨")
 
-    # 신규 청크 필터링
+    if not chunks:
+        print("❌ 청크 파일이 비어 있습니다. 기존 DB를 유지하고 종료합니다.")
+        return {"added": 0, "removed": 0, "total": len(existing_ids)}
+
+    # 청크 ID는 내용 기반 결정적 ID → ID 비교만으로 신규/삭제/변경 없음 판별
+    chunk_ids = {chunk["id"] for chunk in chunks}
     new_chunks = [chunk for chunk in chunks if chunk["id"] not in existing_ids]
-    print(f"🎯 신규 청크 {len(new_chunks)}개 임베딩 중...")
+    removed_ids = sorted(existing_ids - chunk_ids)
+    unchanged_count = len(existing_ids & chunk_ids)
+    print(f"📊 변경 사항: 신규 {len(new_chunks)}개 / 삭제 {len(removed_ids)}개 / 변경 없음 {unchanged_count}개")
 
-    if not new_chunks:
-        print("📭 추가할 신규 청크 없음.")
-        return
+    if not new_chunks and not removed_ids:
+        print("📭 추가/삭제할 청크 없음.")
+        if existing_ids and not os.path.exists(os.path.join(live_dir, VECTOR_STORE_FILE)):
+            save_vector_export(live_collection, live_dir)
+        return {"added": 0, "removed": 0, "total": len(existing_ids)}
 
-    # 배치로 임베딩 및 추가
-    batch_size = 10
-    for i in range(0, len(new_chunks), batch_size):
-        batch = new_chunks[i:i+batch_size]
-        
-        # 메타데이터와 문서 분리
-        documents = [chunk["text"] for chunk in batch]
+    # 🔄 현재 세대를 복사한 새 세대에만 변경 적용 → 서버는 갱신 중에도 바뀌지 않는 색인을 읽음
+    generation, index_dir = create_generation(CHROMA_DIR)
+    print(f"📁 새 색인 세대 생성: {generation}")
+    try:
+        collection, _ = open_collection(index_dir, embedding_func)
+        apply_changes(collection, embedding_func, new_chunks, removed_ids)
 
-        # 메타데이터와 문서 분리
-        metadatas = [{k: str(v) for k, v in chunk.items() if k not in ["text", "id"]} for chunk in batch]
+        # 로컬 벡터 검색(VECTOR_BACKEND=local)용 임베딩 행렬과 코퍼스 파일을 세대에 함께 저장
+        save_vector_export(collection, index_dir)
+        if os.path.exists(CORPUS_STORE_PATH):
+            shutil.copy2(CORPUS_STORE_PATH, os.path.join(index_dir, CORPUS_STORE_FILE))
+            # 키워드/날짜 색인 스냅샷 → 서버가 새 세대를 구축 없이 바로 불러옴
+            start = time.perf_counter()
+            write_snapshot(index_dir)
+            print(f"⚡ 색인 스냅샷 저장 ({time.perf_counter() - start:.1f}초)")
+        final_count = collection.count()
+    except Exception as e:
+        # 게시하지 않은 세대는 삭제 → 서버는 이전 세대를 계속 사용, 다음 실행 때 다시 시도
+        print(f"❌ 색인 갱신 실패로 중단: {e}")
+        discard_generation(generation, CHROMA_DIR)
+        exit(1)
 
-        ids = [chunk["id"] for chunk in batch]
-        
-        print(f"🔄 배치 {i//batch_size + 1}/{(len(new_chunks)-1)//batch_size + 1} 처리 중...")
-        
-        # ChromaDB에 추가 (임베딩 자동 생성)
-        collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-    
-    print("✅ 모든 청크 임베딩 완료!")
+    # CURRENT 교체 → 실행 중인 서버가 다음 확인 때 새 세대로 검색 상태(캐시 포함)를 교체
+    publish_generation(generation, CHROMA_DIR)
+    print(f"🚀 새 색인 세대 게시: {generation}")
+    # 세대 교체를 지원하지 않는 프로세스의 답변 캐시도 비워지도록 색인 버전 갱신
+    write_index_version()
     
     # 최종 통계
-    final_count = len(collection.get()["ids"])
     print(f"📊 최종 청크 수: {final_count}개")
+    return {"added": len(new_chunks), "removed": len(removed_ids), "total": final_count}
 
 if __name__ == "__main__":
     main()
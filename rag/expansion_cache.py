@@ -0,0 +1,93 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Optional
+from rag.answer_cache import normalize_query
+
+# ✅ 설정
+EXPANSION_CACHE_PATH = os.getenv("EXPANSION_CACHE_PATH", os.path.join("rag", "cache", "expansion_cache.sqlite3"))
+EXPANSION_CACHE_TTL = int(os.getenv("EXPANSION_CACHE_TTL", str(24 * 3600)))  # 확장 결과 유효 시간 (초)
+EXPANSION_CACHE_SIZE = int(os.getenv("EXPANSION_CACHE_SIZE", "5000"))  # 최대 저장 질문 수
+
+
+class ExpansionCache:
+    """LLM 쿼리 확장 결과를 SQLite 파일에 저장 (서버 재시작/여러 워커 간 공유)
+
+    키: 정규화한 질문 + 오늘 날짜 (확장 프롬프트에 오늘 날짜가 들어가므로 날짜가 바뀌면 새로 생성)
+    """
+
+    def __init__(self, path: str = EXPANSION_CACHE_PATH, ttl: float = EXPANSION_CACHE_TTL,
+                 max_size: int = EXPANSION_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = True
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS expansions ("
+                    " key TEXT PRIMARY KEY, queries TEXT NOT NULL,"
+                    " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_expansions_accessed ON expansions(accessed_at)")
+        except (OSError, sqlite3.Error) as e:
+            # 캐시 파일을 만들 수 없으면 캐시 없이 매번 LLM 확장
+            print(f"⚠️ 쿼리 확장 캐시 사용 불가 ({path}): {e}")
+            self.enabled = False
+
+    @contextmanager
+    def _connect(self):
+        # 요청 스레드마다 짧게 연결 (연결 객체를 스레드/프로세스 간에 공유하지 않음)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # 정상 종료 시 commit, 예외 시 rollback
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return f"{date.today().isoformat()}|{normalize_query(query)}"
+
+    def get(self, query: str) -> Optional[list]:
+        if not self.enabled:
+            return None
+        key = self._key(query)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT queries FROM expansions WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE expansions SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"⚠️ 쿼리 확장 캐시 조회 실패: {e}")
+            return None
+
+    def put(self, query: str, expanded_queries: list):
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO expansions (key, queries, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (self._key(query), json.dumps(expanded_queries, ensure_ascii=False), now, now)
+                )
+                # 만료된 항목 삭제 후, 최대 개수를 넘으면 오래 사용하지 않은 항목부터 삭제
+                conn.execute("DELETE FROM expansions WHERE created_at < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM expansions WHERE key IN ("
+                    " SELECT key FROM expansions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ 쿼리 확장 캐시 저장 실패: {e}")
@@ -0,0 +1,159 @@
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from rag.corpus_store import CORPUS_STORE_FILE, CORPUS_STORE_PATH
+
+# ✅ 설정
+INDEX_ROOT = os.path.join("rag", "chroma_db")
+GENERATIONS_DIR = "generations"
+CURRENT_FILE = "CURRENT"  # 서버가 사용할 세대 이름 (원자적으로 교체)
+KEEP_GENERATIONS = int(os.getenv("KEEP_GENERATIONS", "3"))  # 현재 세대를 포함해 남겨둘 세대 수
+INDEX_POLL_INTERVAL_S = float(os.getenv("INDEX_POLL_INTERVAL_S", "30"))  # 서버가 새 세대를 확인하는 주기
+RETIRE_DELAY_S = float(os.getenv("RETIRE_DELAY_S", "120"))  # 교체 후 이전 세대를 닫기까지 기다리는 시간
+
+# 세대 디렉토리로 복사하지 않는 루트 항목 (세대 관리 파일, 세대와 무관한 파일)
+# 코퍼스 파일: 세대 안에서는 항상 CORPUS_STORE_FILE, 루트에는 CORPUS_STORE_PATH 파일명으로 저장됨
+ROOT_ONLY_ENTRIES = {
+    GENERATIONS_DIR, CURRENT_FILE, CURRENT_FILE + ".tmp", "index_version",
+    CORPUS_STORE_FILE, os.path.basename(CORPUS_STORE_PATH),
+}
+
+
+def current_generation(root: str = INDEX_ROOT) -> Optional[str]:
+    """CURRENT가 가리키는 세대 이름 (세대가 없던 이전 구조면 None)"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return name if name and os.path.isdir(os.path.join(root, GENERATIONS_DIR, name)) else None
+
+
+def generation_dir(root: str = INDEX_ROOT, name: Optional[str] = None) -> str:
+    """세대 디렉토리 경로 (name이 None이면 세대 구조 이전처럼 루트 자체)"""
+    return os.path.join(root, GENERATIONS_DIR, name) if name else root
+
+
+def current_index_dir(root: str = INDEX_ROOT) -> str:
+    return generation_dir(root, current_generation(root))
+
+
+def create_generation(root: str = INDEX_ROOT) -> tuple:
+    """현재 세대를 복사해 새 세대 디렉토리 생성 → (세대 이름, 경로)
+
+    라이브 세대는 그대로 두고 복사본에만 변경을 적용하므로, 서버는 갱신 중에도
+    바뀌지 않는 색인을 읽습니다.
+    """
+    source = current_index_dir(root)
+    name = datetime.now().strftime("gen-%Y%m%d-%H%M%S-") + f"{time.time_ns() % 1_000_000_000:09d}"
+    target = generation_dir(root, name)
+    os.makedirs(target)
+    if os.path.isdir(source):
+        for entry in os.listdir(source):
+            if source == root and entry in ROOT_ONLY_ENTRIES:
+                continue
+            src_path = os.path.join(source, entry)
+            if os.path.isdir(src_path):
+                shutil.copytree(src_path, os.path.join(target, entry))
+            else:
+                shutil.copy2(src_path, os.path.join(target, entry))
+    return name, target
+
+
+def publish_generation(name: str, root: str = INDEX_ROOT, keep: int = KEEP_GENERATIONS):
+    """CURRENT를 새 세대로 원자적 교체 + 오래된 세대 정리"""
+    tmp_path = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+    prune_generations(root, keep)
+
+
+def discard_generation(name: str, root: str = INDEX_ROOT):
+    """게시하지 않은(실패한) 세대 삭제"""
+    shutil.rmtree(generation_dir(root, name), ignore_errors=True)
+
+
+def prune_generations(root: str = INDEX_ROOT, keep: int = KEEP_GENERATIONS):
+    # 세대 이름은 생성 시각 순으로 정렬됨 → 현재 세대는 항상 유지, 나머지는 최신 keep-1개만
+    current = current_generation(root)
+    generations_path = os.path.join(root, GENERATIONS_DIR)
+    if not os.path.isdir(generations_path):
+        return
+    names = sorted(os.listdir(generations_path), reverse=True)
+    kept = 1 if current else 0
+    for name in names:
+        if name == current:
+            continue
+        if kept < keep:
+            kept += 1
+            continue
+        shutil.rmtree(os.path.join(generations_path, name), ignore_errors=True)
+        print(f"🧹 이전 색인 세대 삭제: {name}")
+
+
+class GenerationWatcher:
+    """서버 프로세스에서 CURRENT를 주기적으로 확인해 새 세대의 검색 상태로 교체
+
+    새 상태(factory(색인 경로))는 백그라운드 스레드에서 완전히 만든 뒤 참조 하나만 바꾸므로,
+    요청은 시작 시 잡은 상태(current)를 끝까지 사용하고 교체 중에도 멈추지 않습니다.
+    이전 상태는 진행 중인 요청이 끝날 시간(RETIRE_DELAY_S)이 지난 뒤 close()로 정리합니다.
+    """
+
+    def __init__(self, factory: Callable[[str], object], root: str = INDEX_ROOT,
+                 interval: float = INDEX_POLL_INTERVAL_S, retire_delay: float = RETIRE_DELAY_S):
+        self.factory = factory
+        self.root = root
+        self.interval = interval
+        self.retire_delay = retire_delay
+        self.generation = current_generation(root)
+        self.current = factory(generation_dir(root, self.generation))
+        self._failed = None  # 불러오기에 실패한 세대 (다음 세대가 나올 때까지 재시도 안 함)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self) -> bool:
+        """새 세대가 게시됐으면 불러와 교체 → 교체 여부"""
+        name = current_generation(self.root)
+        if name is None or name == self.generation or name == self._failed:
+            return False
+        print(f"🔄 새 색인 세대 감지: {name} (현재: {self.generation or '초기 구조'})")
+        start = time.perf_counter()
+        try:
+            state = self.factory(generation_dir(self.root, name))
+        except Exception as e:
+            print(f"❌ 새 색인 세대 불러오기 실패, 현재 세대 유지: {e}")
+            self._failed = name
+            return False
+
+        previous = self.current
+        self.current = state
+        self.generation = name
+        print(f"✅ 색인 세대 교체 완료: {name} ({time.perf_counter() - start:.1f}초)")
+
+        if hasattr(previous, "close"):
+            if self.retire_delay <= 0:
+                # 요청을 처리하지 않는 프로세스(pre-fork 부모)는 바로 정리
+                previous.close()
+            else:
+                timer = threading.Timer(self.retire_delay, previous.close)
+                timer.daemon = True
+                timer.start()
+        return True
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import time
+from array import array
+from typing import Optional
+
+from rag.corpus_store import CORPUS_STORE_FILE, CorpusStore, read_mapped_file, write_mapped_file
+from rag.date_index import DateIndex, parse_date_string, yearless_month_day
+from rag.keyword_index import KeywordIndex
+
+# ✅ 설정
+SNAPSHOT_FILE = "index_snapshot.bin"  # 색인 세대 디렉토리 안 (corpus.bin 옆)
+MAGIC = b"KNOUSNAPSHOT\n"
+# 키워드 분석기/색인(날짜 색인 포함) 구조가 바뀌면 올림 → 이전 스냅샷은 무시하고 다시 구축
+SNAPSHOT_VERSION = 2
+FINGERPRINT_BLOCK = 1 << 20
+
+
+def corpus_fingerprint(path: str) -> str:
+    """스냅샷이 어떤 코퍼스 파일로 만들어졌는지 확인하는 해시"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(FINGERPRINT_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def doc_ordinals(corpus: CorpusStore) -> tuple:
+    """문서별 연도 있는 날짜 ordinal + 연도 없는 날짜 {문서 위치: (월, 일)}
+
+    연도 있는 날짜는 청크 생성 시 저장한 date_ordinal 사용, 없으면(이전 형식 데이터) 날짜 문자열을 한 번만 파싱
+    연도 없는 날짜는 (이전 데이터에 생성 시점 기준으로 추정한 ordinal이 있어도) DateIndex가 조회 시점에 해석
+    """
+    ordinals, yearless = [], {}
+    for pos in range(len(corpus)):
+        date_str = corpus.field('date', pos)
+        month_day = yearless_month_day(date_str)
+        if month_day:
+            yearless[pos] = month_day
+            ordinals.append(0)
+            continue
+        ordinal = corpus.ordinal(pos)
+        if not ordinal:
+            parsed = parse_date_string(date_str)
+            ordinal = parsed.toordinal() if parsed else 0
+        ordinals.append(ordinal)
+    return ordinals, yearless
+
+
+def build_indexes(corpus: CorpusStore) -> tuple:
+    """코퍼스 → (키워드 역색인, 날짜 색인의 문서별 ordinal, 연도 없는 날짜)"""
+    positions = range(len(corpus))
+    keyword_index = KeywordIndex.build(
+        corpus.ids(),
+        (corpus.document(pos) for pos in positions),
+        ({'title': corpus.field('title', pos, '')} for pos in positions)
+    )
+    return (keyword_index, *doc_ordinals(corpus))
+
+
+def save_snapshot(path: str, keyword_index: KeywordIndex, ordinals: list, yearless: dict, fingerprint: str):
+    header, sections = keyword_index.snapshot()
+    header = {"version": SNAPSHOT_VERSION, "fingerprint": fingerprint, "keyword": header}
+    sections.append(("date.ordinals", array('i', ordinals)))
+    # 연도 없는 날짜는 월*100+일로 저장 → 불러올 때마다 그날 기준으로 연도 추정
+    sections.append(("date.yearless_pos", array('i', yearless)))
+    sections.append(("date.yearless_md", array('i', (month * 100 + day for month, day in yearless.values()))))
+    write_mapped_file(path, MAGIC, header, sections)
+
+
+def load_snapshot(path: str, fingerprint: str) -> Optional[tuple]:
+    """스냅샷 → (키워드 역색인, 문서별 ordinal, 연도 없는 날짜), 없거나 버전/코퍼스가 다르면 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        header, arrays, _, _ = read_mapped_file(path, MAGIC)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 색인 스냅샷 로드 실패 ({e}), 다시 구축합니다.")
+        return None
+    if header.get("version") != SNAPSHOT_VERSION or header.get("fingerprint") != fingerprint:
+        print("ℹ️ 색인 스냅샷이 현재 코퍼스/버전과 달라 다시 구축합니다.")
+        return None
+    yearless = {pos: divmod(md, 100) for pos, md in zip(arrays["date.yearless_pos"], arrays["date.yearless_md"])}
+    return KeywordIndex.from_snapshot(header["keyword"], arrays), arrays["date.ordinals"], yearless
+
+
+def load_indexes(corpus: CorpusStore) -> tuple:
+    """코퍼스 파일 옆의 스냅샷에서 (키워드 역색인, 날짜 색인) 로드, 없으면 구축 후 스냅샷 저장
+
+    코퍼스를 파일이 아닌 컬렉션에서 불러온 경우에는 스냅샷 없이 매번 구축합니다.
+    """
+    start = time.perf_counter()
+    snapshot_path = os.path.join(os.path.dirname(corpus.path), SNAPSHOT_FILE) if corpus.path else None
+    fingerprint = corpus_fingerprint(corpus.path) if corpus.path else None
+
+    loaded = load_snapshot(snapshot_path, fingerprint) if snapshot_path else None
+    if loaded is not None:
+        keyword_index, ordinals, yearless = loaded
+        print(f"⚡ 색인 스냅샷 로드: {snapshot_path} ({time.perf_counter() - start:.2f}초)")
+    else:
+        keyword_index, ordinals, yearless = build_indexes(corpus)
+        if snapshot_path:
+            try:
+                save_snapshot(snapshot_path, keyword_index, ordinals, yearless, fingerprint)
+                print(f"💾 색인 스냅샷 저장: {snapshot_path}")
+            except OSError as e:
+                # 읽기 전용 볼륨 등 → 다음 시작 때 다시 구축
+                print(f"⚠️ 색인 스냅샷 저장 실패: {e}")
+    return keyword_index, DateIndex(ordinals, yearless)
+
+
+def write_snapshot(index_dir: str) -> bool:
+    """색인 세대를 게시하기 전에 스냅샷을 미리 만들어 둠 (서버가 새 세대를 바로 불러오도록)"""
+    corpus_path = os.path.join(index_dir, CORPUS_STORE_FILE)
+    if not os.path.exists(corpus_path):
+        return False
+    keyword_index, ordinals, yearless = build_indexes(CorpusStore.load(corpus_path))
+    save_snapshot(os.path.join(index_dir, SNAPSHOT_FILE), keyword_index, ordinals, yearless, corpus_fingerprint(corpus_path))
+    return True
@@ -0,0 +1,182 @@
+import math
+from array import array
+from typing import Optional
+
+from rag.aho_corasick import PhraseMatcher
+from rag.text_analyzer import KoreanAnalyzer
+
+# ✅ 설정
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 5.0  # 제목 매칭 가중치 (기존 키워드 검색과 동일하게 5배)
+EXACT_PHRASE_BONUS = 10.0  # 제목에 핵심 구문이 그대로 있을 때 보너스
+
+FIELDS = ("title", "body")
+
+
+class KeywordIndex:
+    """제목/본문 필드를 분리한 역색인 (term_id → posting list) + BM25 점수 계산
+
+    챗봇 초기화 시 한 번만 구축하고, 검색 시에는 질의 용어의 posting만 조회합니다.
+    용어는 KoreanAnalyzer의 bigram id이며, posting은 (문서 번호 배열, 빈도 배열) 쌍입니다.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, title_weight: float = TITLE_WEIGHT,
+                 analyzer: Optional[KoreanAnalyzer] = None):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self.analyzer = analyzer or KoreanAnalyzer()
+
+        self.doc_ids = []
+        self.titles_lower = []
+        # field -> {term_id: (array('i') doc_idx, array('i') tf)}
+        self.postings = {field: {} for field in FIELDS}
+        self.doc_lengths = {field: array('i') for field in FIELDS}
+        self.avg_lengths = {field: 0.0 for field in FIELDS}
+        # 정확한 구문(소문자) → 제목에 포함한 문서 번호 (처음 질의될 때 제목 전체를 한 번 훑어 계산)
+        self.phrase_docs = {}
+
+    @classmethod
+    def build(cls, ids: list, documents: list, metadatas: list, **kwargs) -> "KeywordIndex":
+        """Chroma 컬렉션 데이터(ids/documents/metadatas)로 색인 구축"""
+        index = cls(**kwargs)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            title = metadata.get('title', '') if metadata else ''
+            index._add(doc_id, title or '', document or '')
+        index._finalize()
+        return index
+
+    def _add(self, doc_id: str, title: str, document: str):
+        doc_idx = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.titles_lower.append(title.lower())
+
+        for field, text in (("title", title), ("body", document)):
+            term_ids = self.analyzer.index_terms(text)
+            self.doc_lengths[field].append(len(term_ids))
+
+            term_freqs = {}
+            for term_id in term_ids:
+                term_freqs[term_id] = term_freqs.get(term_id, 0) + 1
+
+            field_postings = self.postings[field]
+            for term_id, tf in term_freqs.items():
+                posting = field_postings.get(term_id)
+                if posting is None:
+                    posting = field_postings[term_id] = (array('i'), array('i'))
+                posting[0].append(doc_idx)
+                posting[1].append(tf)
+
+    def _finalize(self):
+        for field in FIELDS:
+            lengths = self.doc_lengths[field]
+            self.avg_lengths[field] = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def snapshot(self) -> tuple:
+        """스냅샷 저장용 (헤더 dict, [(구역 이름, 배열)]) - 필드별 posting을 용어 순 CSR 배열로 연결"""
+        header = {
+            "vocab": list(self.analyzer.vocab),  # 삽입 순서 = term_id 순서
+            "doc_ids": self.doc_ids,
+            "titles_lower": self.titles_lower,
+            "avg_lengths": self.avg_lengths,
+        }
+        sections = []
+        for field in FIELDS:
+            field_postings = self.postings[field]
+            term_ids = array('i', sorted(field_postings))
+            offsets, docs, tfs = array('q', [0]), array('i'), array('i')
+            for term_id in term_ids:
+                doc_idxs, term_tfs = field_postings[term_id]
+                docs.extend(doc_idxs)
+                tfs.extend(term_tfs)
+                offsets.append(len(docs))
+            sections += [
+                (f"{field}.terms", term_ids), (f"{field}.offsets", offsets),
+                (f"{field}.docs", docs), (f"{field}.tfs", tfs), (f"{field}.lengths", self.doc_lengths[field]),
+            ]
+        return header, sections
+
+    @classmethod
+    def from_snapshot(cls, header: dict, arrays: dict, **kwargs) -> "KeywordIndex":
+        """snapshot() 결과로 복원 (posting은 매핑된 배열의 구간 참조, 복사 없음)"""
+        index = cls(**kwargs)
+        vocab = header["vocab"]
+        index.analyzer.vocab = dict(zip(vocab, range(len(vocab))))
+        index.doc_ids = header["doc_ids"]
+        index.titles_lower = header["titles_lower"]
+        for field in FIELDS:
+            offsets, docs, tfs = arrays[f"{field}.offsets"], arrays[f"{field}.docs"], arrays[f"{field}.tfs"]
+            index.postings[field] = {
+                term_id: (docs[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+                for i, term_id in enumerate(arrays[f"{field}.terms"])
+            }
+            index.doc_lengths[field] = arrays[f"{field}.lengths"]
+            index.avg_lengths[field] = header["avg_lengths"][field]
+        return index
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self.analyzer)
+
+    def _idf(self, df: int) -> float:
+        n_docs = len(self.doc_ids)
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def _score_field(self, field: str, term_ids, scores: dict, weight: float):
+        field_postings = self.postings[field]
+        lengths = self.doc_lengths[field]
+        avg_length = self.avg_lengths[field] or 1.0
+        k1, b = self.k1, self.b
+
+        for term_id in term_ids:
+            posting = field_postings.get(term_id)
+            if posting is None:
+                continue
+            doc_idxs, tfs = posting
+            idf_weight = weight * self._idf(len(doc_idxs)) * (k1 + 1)
+            for doc_idx, tf in zip(doc_idxs, tfs):
+                norm = k1 * (1 - b + b * lengths[doc_idx] / avg_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf_weight * tf / (tf + norm)
+
+    def match_phrases(self, phrases):
+        """아직 계산하지 않은 구문을 한 자동자로 묶어 제목마다 한 번만 훑음 → phrase_docs에 저장"""
+        missing = [phrase for phrase in phrases if phrase not in self.phrase_docs]
+        if not missing:
+            return
+        matcher = PhraseMatcher(missing)
+        hits = [[] for _ in matcher.patterns]
+        for doc_idx, title in enumerate(self.titles_lower):
+            for idx in matcher.find_indices(title):
+                hits[idx].append(doc_idx)
+        self.phrase_docs.update(zip(matcher.patterns, hits))
+
+    def search(self, keywords, exact_phrases=(), limit: Optional[int] = None) -> list:
+        """키워드 집합으로 BM25 검색 → [(doc_id, score), ...] (점수 내림차순)"""
+        term_ids = set()
+        for keyword in keywords:
+            term_ids |= self.analyzer.query_terms(keyword)
+
+        # 용어/동점 문서 처리 순서를 고정 → 해시 시드와 무관하게 같은 순위 (부동소수점 합산 순서 포함)
+        term_ids = sorted(term_ids)
+        scores = {}
+        if term_ids:
+            self._score_field("body", term_ids, scores, 1.0)
+            self._score_field("title", term_ids, scores, self.title_weight)
+
+        # 🚀 정확한 구문 매칭 보너스 (제목 기준)
+        phrases = [phrase.lower() for phrase in exact_phrases]
+        self.match_phrases(phrases)
+        bonus_docs = set()
+        for phrase in phrases:
+            bonus_docs.update(self.phrase_docs[phrase])
+        for doc_idx in bonus_docs:
+            scores[doc_idx] = scores.get(doc_idx, 0.0) + EXACT_PHRASE_BONUS
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(self.doc_ids[doc_idx], score) for doc_idx, score in ranked]
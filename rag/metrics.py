@@ -0,0 +1,279 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ✅ 설정
+# 단계별 소요 시간 히스토그램 구간 (초)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# pre-fork 워커가 자기 레지스트리를 공유 디렉토리에 쓰는 주기 (초, 출력은 최대 이만큼 늦음)
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "1"))
+ARCHIVE_FILE = "archived.json"  # 종료된 워커들의 합계
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """누적 구간 히스토그램 (Prometheus histogram 형식)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 마지막 칸: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """요청 단계별 지연 시간 히스토그램, 처리 건수 합계, 카운터를 모아 Prometheus 텍스트로 출력"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}  # stage → Histogram
+        self.items = {}  # (stage, item) → [합계, 관측 수]
+        self.counters = {}  # (name, labels 튜플) → 값
+        self.updates = 0  # 변경 횟수 (바뀌었을 때만 파일에 쓰기 위함)
+
+    def observe(self, stage: str, seconds: float, counts: dict = None):
+        with self.lock:
+            self.updates += 1
+            histogram = self.durations.get(stage)
+            if histogram is None:
+                histogram = self.durations[stage] = Histogram()
+            histogram.observe(seconds)
+            for item, value in (counts or {}).items():
+                total = self.items.setdefault((stage, item), [0, 0])
+                total[0] += value
+                total[1] += 1
+
+    def inc(self, name: str, amount: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.updates += 1
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        """JSON으로 저장할 수 있는 현재 값 (다른 프로세스에서 merge로 합침)"""
+        with self.lock:
+            return {
+                "durations": {stage: {"counts": list(histogram.counts), "sum": histogram.sum, "count": histogram.count}
+                              for stage, histogram in self.durations.items()},
+                "items": [[stage, item, total, count] for (stage, item), (total, count) in self.items.items()],
+                "counters": [[name, [list(label) for label in labels], value]
+                             for (name, labels), value in self.counters.items()],
+            }
+
+    def merge(self, snapshot: dict):
+        """다른 레지스트리의 snapshot()을 더함"""
+        with self.lock:
+            self.updates += 1
+            for stage, data in snapshot.get("durations", {}).items():
+                histogram = self.durations.get(stage)
+                if histogram is None:
+                    histogram = self.durations[stage] = Histogram()
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, data["counts"])]
+                histogram.sum += data["sum"]
+                histogram.count += data["count"]
+            for stage, item, value, count in snapshot.get("items", []):
+                total = self.items.setdefault((stage, item), [0, 0])
+                total[0] += value
+                total[1] += count
+            for name, labels, value in snapshot.get("counters", []):
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [
+                "# HELP knou_stage_duration_seconds 요청 처리 단계별 소요 시간",
+                "# TYPE knou_stage_duration_seconds histogram",
+            ]
+            for stage in sorted(self.durations):
+                histogram = self.durations[stage]
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"knou_stage_duration_seconds_bucket{_labels({'stage': stage, 'le': le})} {cumulative}")
+                lines.append(f"knou_stage_duration_seconds_sum{_labels({'stage': stage})} {_number(histogram.sum)}")
+                lines.append(f"knou_stage_duration_seconds_count{_labels({'stage': stage})} {histogram.count}")
+
+            lines += [
+                "# HELP knou_stage_items 단계별 처리 건수 (후보 문서 수, 프롬프트 길이 등)",
+                "# TYPE knou_stage_items summary",
+            ]
+            for (stage, item), (total, count) in sorted(self.items.items()):
+                labels = _labels({"stage": stage, "item": item})
+                lines.append(f"knou_stage_items_sum{labels} {_number(total)}")
+                lines.append(f"knou_stage_items_count{labels} {count}")
+
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{name}{_labels(dict(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# 프로세스 전역 레지스트리 (/api/metrics 에서 출력)
+METRICS = MetricsRegistry()
+
+
+def _write_json(path: str, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class MultiprocessMetrics:
+    """pre-fork 워커들의 레지스트리를 공유 디렉토리의 파일로 합쳐 출력
+
+    요청은 임의의 워커가 받으므로, 각 워커는 자기 레지스트리를 METRICS_FLUSH_S마다
+    worker-<pid>-<시작 시각>.json 으로 덮어쓰고 /api/metrics를 받은 워커가 모든 파일을 합쳐 출력합니다.
+    종료된 워커의 파일은 부모 프로세스가 archived.json에 합쳐 두므로 카운터가 줄어들지 않습니다.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.worker_file = None
+
+    def start_worker(self, registry: MetricsRegistry = METRICS, interval: float = METRICS_FLUSH_S):
+        """워커 프로세스에서 호출 (fork 후): 레지스트리가 바뀌었을 때만 주기적으로 파일에 씀"""
+        self.worker_file = os.path.join(self.path, f"worker-{os.getpid()}-{time.time_ns()}.json")
+
+        def flush_loop():
+            written = None
+            while True:
+                if registry.updates != written:
+                    written = registry.updates
+                    self.flush(registry)
+                time.sleep(interval)
+
+        threading.Thread(target=flush_loop, name="metrics-flush", daemon=True).start()
+
+    def flush(self, registry: MetricsRegistry = METRICS):
+        try:
+            _write_json(self.worker_file, registry.snapshot())
+        except OSError as e:
+            print(f"⚠️ 메트릭 파일 저장 실패: {e}")
+
+    def collect(self) -> MetricsRegistry:
+        """모든 워커 파일 + 종료된 워커 합계 → 합친 레지스트리"""
+        total = MetricsRegistry()
+        snapshots = {}
+        for name in os.listdir(self.path):
+            if name.startswith("worker-") and name.endswith(".json"):
+                snapshot = _read_json(os.path.join(self.path, name))
+                if snapshot is not None:
+                    snapshots[name] = snapshot
+        # 워커 파일보다 나중에 읽음 → 읽은 뒤 보관된 파일은 archived 쪽 목록으로 중복 제외
+        archive = _read_json(os.path.join(self.path, ARCHIVE_FILE)) or {}
+        archived = set(archive.get("workers", []))
+        total.merge(archive.get("metrics", {}))
+        for name, snapshot in snapshots.items():
+            if name not in archived:
+                total.merge(snapshot)
+        return total
+
+    def render(self) -> str:
+        return self.collect().render()
+
+    def archive(self, pid: int):
+        """부모 프로세스에서 호출: 종료된 워커의 파일을 archived.json에 합친 뒤 삭제"""
+        archive_path = os.path.join(self.path, ARCHIVE_FILE)
+        archive = _read_json(archive_path) or {}
+        total = MetricsRegistry()
+        total.merge(archive.get("metrics", {}))
+        existing = set(os.listdir(self.path))
+        # 이미 삭제된 워커 파일 이름은 목록에서 정리
+        workers = [name for name in archive.get("workers", []) if name in existing]
+        done = [name for name in existing if name.startswith(f"worker-{pid}-") and name.endswith(".json")]
+        for name in done:
+            snapshot = _read_json(os.path.join(self.path, name))
+            if snapshot is not None:
+                total.merge(snapshot)
+            workers.append(name)
+        if not done:
+            return
+        try:
+            _write_json(archive_path, {"metrics": total.snapshot(), "workers": workers})
+            for name in done:
+                os.remove(os.path.join(self.path, name))
+        except OSError as e:
+            print(f"⚠️ 종료된 워커 메트릭 보관 실패: {e}")
+
+
+class Span:
+    def __init__(self, stage: str, counts: dict):
+        self.stage = stage
+        self.counts = dict(counts)
+        self.duration = 0.0
+
+    def set(self, **counts):
+        self.counts.update(counts)
+
+
+class RequestTrace:
+    """한 요청의 단계별 소요 시간 기록 (단계가 끝날 때마다 레지스트리에 반영, 여러 스레드에서 사용 가능)"""
+
+    def __init__(self, registry: MetricsRegistry = METRICS):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, **counts) -> Span:
+        span = Span(stage, counts)
+        span.duration = seconds
+        with self.lock:
+            self.spans.append(span)
+        self.registry.observe(stage, seconds, span.counts)
+        return span
+
+    @contextmanager
+    def span(self, stage: str, **counts):
+        span = Span(stage, counts)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.record(stage, time.perf_counter() - start, **span.counts)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def finish(self, outcome: str):
+        """요청 전체 시간 기록 + 단계별 요약 한 줄 출력"""
+        self.record("total", self.elapsed())
+        self.registry.inc("knou_chat_requests_total", outcome=outcome)
+        with self.lock:
+            summary = ", ".join(f"{span.stage}={span.duration * 1000:.0f}ms" for span in self.spans)
+        print(f"⏱️ 단계별 소요 시간 ({outcome}): {summary}")
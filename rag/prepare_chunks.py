@@ -1,41 +1,155 @@
 import os
+import re
 import csv
 import json
-import uuid
-from datetime import datetime
+import math
+import hashlib
+import argparse
+from multiprocessing import Pool
 
-CHUNK_SIZE = 1000
-OVERLAP = 200
+from rag.corpus_store import CORPUS_STORE_PATH, CorpusStore
+from rag.date_index import date_to_ordinal
+
+# ✅ 설정
+CHUNK_TOKENS = 500  # 청크당 토큰 예산 (머리글 포함, estimate_tokens 기준)
+OVERLAP_TOKENS = 50  # 앞 청크 끝 문장을 이 예산 안에서만 다음 청크에 반복
+# 청크 분할 방식이 바뀌면 올림 → 증분 모드가 이전 manifest를 무시하고 전체 다시 생성
+CHUNKER_VERSION = 2
+POOL_BATCH_SIZE = 32  # 병렬 모드에서 작업 프로세스에 한 번에 넘기는 행 수
 
 INPUT_FILES = [
     {"path": "data/notices_2025.csv", "type": "notice"},
     {"path": "data/cs_notices_2025.csv", "type": "cs_notice"},
+    # 전체 크롤링 이후 fetch_cs_update.py가 누적 저장한 신규/수정 컴공 공지 (같은 게시글이면 뒤의 파일이 우선)
+    {"path": "data/cs_notices_update.csv", "type": "cs_notice"},
     {"path": "data/common_schedule.csv", "type": "schedule"},
 ]
 
 OUTPUT_FILE = "rag/chunks.jsonl"
+# 게시글별 행 해시 (증분 모드에서 새 글/수정된 글만 다시 청크로 만들기 위해 사용)
+MANIFEST_FILE = "rag/chunks_manifest.json"
+
+
+# 문장 끝 (마침표/물음표/느낌표 뒤 공백) 기준 분리
+SENTENCE_END = re.compile(r'(?<=[.!?。])\s+')
+# 크롤링한 표: 셀은 탭 줄, 행은 빈 줄 여러 개로 구분됨
+TABLE_CELL_SEP = re.compile(r'\s*\n\s*\t\s*\n\s*|\s*\t\s*')
+BLOCK_SEP = re.compile(r'\n[ \t]*\n[ \t]*\n+')
+LINE_BREAKS = re.compile(r'\n[\s\xa0]*')
+
+
+def estimate_tokens(text):
+    """토큰 수 근사치 (토크나이저 API 호출 없이 계산)
+
+    공백으로 나눈 조각마다 한글 등 비ASCII 문자는 2글자, ASCII 문자는 4글자를 1토큰으로 세고,
+    연속된 줄바꿈(빈 줄 포함)은 1토큰으로 셉니다.
+    """
+    tokens = len(LINE_BREAKS.findall(text))
+    for piece in text.split():
+        non_ascii = sum(1 for ch in piece if ord(ch) > 127)
+        tokens += max(1, math.ceil(non_ascii / 2 + (len(piece) - non_ascii) / 4))
+    return tokens
 
+def _collapse(text):
+    return " ".join(text.split())
+
+def split_units(content):
+    """본문 → 나눌 수 없는 단위(표 행, 문단 줄) 목록
+
+    표는 행 단위로 셀을 " | "로 이어 한 줄로 만들고, 나머지는 줄(문단) 단위로 나눕니다.
+    \xa0, 연속 공백/빈 줄은 정리합니다.
+    """
+    units = []
+    for block in BLOCK_SEP.split(content.replace("\xa0", " ").replace("\r", "")):
+        if "\t" in block:
+            cells = [_collapse(cell) for cell in TABLE_CELL_SEP.split(block)]
+            row = " | ".join(cell for cell in cells if cell)
+            if row:
+                units.append(row)
+            continue
+        for line in block.split("\n"):
+            line = _collapse(line)
+            if line:
+                units.append(line)
+    return units
+
+def _split_long(unit, budget):
+    """예산보다 긴 단위 → 문장 단위, 그래도 길면 어절 단위로 분리"""
+    pieces = []
+    for sentence in SENTENCE_END.split(unit):
+        if estimate_tokens(sentence) <= budget:
+            pieces.append(sentence)
+            continue
+        current, current_tokens = [], 0
+        for word in sentence.split():
+            word_tokens = estimate_tokens(word)
+            if current and current_tokens + word_tokens > budget:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+def split_text(content, header="", max_tokens=CHUNK_TOKENS, overlap_tokens=OVERLAP_TOKENS):
+    """문단/문장/표 행 경계를 지키며 토큰 예산 안에서 청크 분할
+
+    각 청크는 header(제목/날짜)로 한 번만 시작하고, 본문 단위를 예산까지 채웁니다.
+    다음 청크는 앞 청크의 마지막 문장들을 overlap_tokens 안에서만 반복합니다.
+    """
+    # 단위마다 이어 붙일 줄바꿈 1토큰을 함께 계산
+    budget = max(2, max_tokens - estimate_tokens(header))
+    units = []
+    for unit in split_units(content):
+        units.extend([unit] if estimate_tokens(unit) < budget else _split_long(unit, budget - 1))
 
-def split_text(text, max_length=CHUNK_SIZE, overlap=OVERLAP):
     chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + max_length, len(text))
-        chunks.append(text[start:end])
-        start += max_length - overlap
+    current, current_tokens, fresh = [], 0, 0  # fresh: 앞 청크에서 반복하지 않은 새 단위 수
+    for unit in units:
+        unit_tokens = estimate_tokens(unit) + 1
+        if fresh and current_tokens + unit_tokens > budget:
+            chunks.append(header + "\n".join(current))
+            # 겹침: 끝에서부터 예산 안에 들어가는 단위만 남김
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous) + 1
+                if carried_tokens + previous_tokens > overlap_tokens or carried_tokens + previous_tokens + unit_tokens > budget:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            current, current_tokens, fresh = carried, carried_tokens, 0
+        current.append(unit)
+        current_tokens += unit_tokens
+        fresh += 1
+    if fresh or not chunks:
+        chunks.append(header + "\n".join(current))
     return chunks
 
+def article_id_of(row):
+    return row.get("id") or row.get("url") or ""
+
+def row_hash(row):
+    """CSV 행 전체 내용 해시 (게시글 수정 여부 판단)"""
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
 def generate_unique_id(file_type, row_data, chunk_text, chunk_index):
-    """UUID 기반 고유 ID 생성 - 모든 청크가 고유한 ID를 가짐"""
-    return f"{file_type}_{uuid.uuid4().hex[:12]}_{chunk_index}"
+    """(소스 타입, 게시글 ID, 청크 순번, 내용 해시) 기반 결정적 ID
+
+    같은 내용의 청크는 매번 같은 ID를 가지므로, embed_chunks에서
+    신규/삭제/변경 없음 청크를 ID 비교만으로 구분할 수 있습니다.
+    """
+    article_id = article_id_of(row_data)
+    content_hash = hashlib.sha1(chunk_text.encode("utf-8")).hexdigest()
+    key = f"{file_type}|{article_id}|{chunk_index}|{content_hash}"
+    return f"{file_type}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}_{chunk_index}"
 
-def process_row(row, file_type):
+def process_row(row, file_type, revision=None):
     if file_type in ["notice", "cs_notice"]:
         title = row["title"]
         date = row["date"]
         content = row["content"]
         source = row["url"]
-        full_text = f"[{title}]\n{date}\n{content}"
         
         # 메타데이터 구성
         metadata = {
@@ -49,7 +163,6 @@ def process_row(row, file_type):
         content = row["content"]
         title = row.get("title", "일정")
         source = None
-        full_text = f"[{title}]\n{date}\n{content}"
         
         # 메타데이터 구성
         metadata = {
@@ -59,24 +172,31 @@ def process_row(row, file_type):
             "source": source or file_type
         }
     else:
-        return []
+        return
 
-    chunks = split_text(full_text)
-    return [
-        {
+    # 날짜는 청크 생성 시 한 번만 파싱해 정수(ordinal)로 저장 (파싱 실패 시 0)
+    date_ordinal = date_to_ordinal(metadata["date"])
+
+    article_id = article_id_of(row)
+    revision = revision or row_hash(row)
+    # 제목/날짜는 청크마다 머리글로 한 번씩만 (본문 분할 결과 앞에 붙임)
+    header = f"[{metadata['title']}]\n{metadata['date']}\n"
+    for i, chunk in enumerate(split_text(content, header)):
+        yield {
             "id": generate_unique_id(file_type, row, chunk, i),
             "text": chunk,
             "date": metadata["date"],
+            "date_ordinal": date_ordinal,
             "title": metadata["title"], 
             "type": metadata["type"],
-            "source": metadata["source"]
+            "source": metadata["source"],
+            # 같은 게시글의 청크 묶음 식별 (증분 모드에서 추가된 새 버전이 이전 버전을 대체)
+            "article_id": article_id,
+            "revision": revision
         }
-        for i, chunk in enumerate(chunks)
-    ]
-
-def prepare_chunks():
-    all_chunks = []
 
+def iter_rows():
+    """INPUT_FILES의 CSV 행을 순서대로 하나씩 → (파일 타입, 행)"""
     for file_info in INPUT_FILES:
         path = file_info["path"]
         file_type = file_info["type"]
@@ -87,25 +207,187 @@ def prepare_chunks():
             print(f"⚠️ 파일이 존재하지 않습니다: {path}")
             continue
             
-        with open(path, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                chunks = process_row(row, file_type)
-                all_chunks.extend(chunks)
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                yield file_type, row
 
-    print(f"📊 처리 결과:")
-    print(f"   - 총 청크: {len(all_chunks)}개 (UUID 사용으로 모든 청크 고유)")
-
-    # 출력 디렉토리 생성
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    
-    # JSONL 파일로 저장
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as out_f:
-        for chunk in all_chunks:
+def article_key(file_type, article_id):
+    return f"{file_type}|{article_id}"
+
+def load_manifest(path=MANIFEST_FILE):
+    """게시글 키 → revision (분할 방식 버전이 다르면 None)"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("chunker_version") != CHUNKER_VERSION:
+        return None
+    return manifest.get("articles", {})
+
+def save_manifest(revisions, path=MANIFEST_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"chunker_version": CHUNKER_VERSION, "articles": revisions}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def new_stats():
+    return {"rows": 0, "skipped_rows": 0, "chunks": 0, "duplicates": 0, "tokens": 0}
+
+def row_key(file_type, row):
+    # 게시글 ID/URL이 없는 행은 행 내용 자체를 키로 사용
+    return article_key(file_type, article_id_of(row) or row_hash(row))
+
+def article_revisions(rows):
+    """게시글 키별 버전 해시 (같은 게시글의 모든 행을 순서대로 합친 해시)
+
+    같은 게시글이 여러 파일/행에 있어도(예: 전체 크롤링 파일 + 업데이트 파일) 한 번에 비교합니다.
+    청크를 만들지 않고 행만 읽으므로 빠르고, 메모리는 게시글 수에만 비례합니다.
+    """
+    hashers = {}
+    for file_type, row in rows:
+        key = row_key(file_type, row)
+        hasher = hashers.get(key)
+        if hasher is None:
+            hasher = hashers[key] = hashlib.sha1()
+        hasher.update(row_hash(row).encode("utf-8"))
+    return {key: hasher.hexdigest()[:12] for key, hasher in hashers.items()}
+
+def chunk_row(item):
+    """(파일 타입, 행) → [(청크, 토큰 수), ...] (병렬 모드에서는 작업 프로세스가 실행)"""
+    file_type, row = item
+    return [(chunk, estimate_tokens(chunk["text"])) for chunk in process_row(row, file_type)]
+
+def iter_row_chunks(rows, workers=1):
+    """행 스트림 → 행별 chunk_row 결과 스트림 (입력 순서 유지)
+
+    workers > 1이면 행을 프로세스 풀에 나눠 분할하고, imap으로 입력 순서대로 결과를 받으므로
+    출력 파일은 직렬 실행과 완전히 같습니다.
+    """
+    if workers <= 1:
+        yield from map(chunk_row, rows)
+        return
+    with Pool(processes=workers) as pool:
+        yield from pool.imap(chunk_row, rows, chunksize=POOL_BATCH_SIZE)
+
+def iter_chunks(rows, stats, changed_keys=None, workers=1):
+    """행 → 청크 스트림
+
+    changed_keys가 주어지면(증분 모드) 해당 게시글의 행만 청크로 만듭니다.
+    같은 게시글이 여러 번 나오면 동일 ID 청크는 한 번만 내보냅니다.
+    """
+    def selected_rows():
+        for file_type, row in rows:
+            stats["rows"] += 1
+            if changed_keys is not None and row_key(file_type, row) not in changed_keys:
+                stats["skipped_rows"] += 1
+                continue
+            yield file_type, row
+
+    seen_ids = set()
+    for row_chunks in iter_row_chunks(selected_rows(), workers):
+        for chunk, tokens in row_chunks:
+            # 같은 게시글이 여러 번 저장된 경우 동일 ID → 한 번만 저장
+            if chunk["id"] in seen_ids:
+                stats["duplicates"] += 1
+                continue
+            seen_ids.add(chunk["id"])
+            stats["chunks"] += 1
+            stats["tokens"] += tokens
+            yield chunk
+
+def write_chunks(chunks, path, append=False):
+    """청크 스트림을 JSONL로 기록 (전체 모드는 임시 파일에 쓴 뒤 교체)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    target = path if append else path + ".tmp"
+    count = 0
+    with open(target, "a" if append else "w", encoding="utf-8") as out_f:
+        for chunk in chunks:
             out_f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            count += 1
+    if not append:
+        if count == 0 and os.path.exists(path):
+            # 입력 CSV가 하나도 없으면 기존 청크 파일 유지
+            print(f"⚠️ 생성된 청크가 없어 기존 파일을 유지합니다: {path}")
+            os.remove(target)
+            return 0
+        os.replace(target, path)
+    return count
 
-    print(f"✅ {len(all_chunks)}개 청크 저장 완료 → {OUTPUT_FILE}")
+def iter_latest_chunks(path=OUTPUT_FILE):
+    """chunks.jsonl 읽기 → 게시글(타입, 게시글 ID)별 최신 버전 청크만
+
+    증분 모드는 수정된 게시글의 새 청크를 파일 끝에 추가하므로, 같은 게시글의
+    다른 revision이 나오면 앞서 읽은 청크를 버립니다. (이전 형식 청크는 ID 단위)
+    """
+    latest = {}  # 게시글 키 → (revision, [청크])
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if "article_id" in chunk:
+                key = article_key(chunk["type"], chunk["article_id"])
+            else:
+                key = chunk["id"]
+            revision = chunk.get("revision")
+            current = latest.get(key)
+            if current is None or current[0] != revision:
+                # dict에서 지웠다가 다시 넣어 파일 순서상 마지막 위치로 이동
+                latest.pop(key, None)
+                current = latest[key] = (revision, [])
+            current[1].append(chunk)
+    for _, chunks in latest.values():
+        yield from chunks
+
+def load_chunks(path=OUTPUT_FILE):
+    return list(iter_latest_chunks(path))
+
+def prepare_chunks(incremental=False, workers=1):
+    """CSV → 청크 JSONL (행 단위 스트리밍, 전체 청크를 메모리에 모으지 않음)
+
+    incremental=True: manifest와 비교해 새 글/수정된 글의 청크만 기존 파일 끝에 추가
+    (삭제된 게시글은 다음 전체 실행 때 반영)
+    workers > 1: 여러 학년도 백필 등 대량 처리 시 행을 프로세스 풀로 병렬 분할 (결과는 직렬과 동일)
+    반환: 처리 통계 (rows, skipped_rows, chunks, duplicates, tokens + 이번에 저장한 청크 수 written)
+    """
+    manifest = load_manifest() if incremental else None
+    if incremental and (manifest is None or not os.path.exists(OUTPUT_FILE)):
+        print("ℹ️ 이전 실행 기록(manifest)이 없거나 청크 분할 방식이 바뀌어 전체 모드로 실행합니다.")
+        incremental = False
+
+    revisions = article_revisions(iter_rows())
+    changed_keys = None
+    if incremental:
+        changed_keys = {key for key, revision in revisions.items() if manifest.get(key) != revision}
+        print(f"🔍 새 글/수정된 글: {len(changed_keys)}개 (전체 {len(revisions)}개)")
+        # 변경 없는 게시글의 기록은 유지 (삭제된 게시글 기록도 전체 실행 전까지 유지)
+        revisions = {**manifest, **revisions}
+
+    stats = new_stats()
+    count = write_chunks(iter_chunks(iter_rows(), stats, changed_keys, workers), OUTPUT_FILE, append=incremental)
+    if count or not incremental:
+        save_manifest(revisions)
+    if os.path.exists(OUTPUT_FILE) and (count or not os.path.exists(CORPUS_STORE_PATH)):
+        # 챗봇이 시작 시 읽는 열 단위 코퍼스 파일 (게시글별 최신 청크 기준)
+        store = CorpusStore.from_chunks(iter_latest_chunks(OUTPUT_FILE))
+        store.save(CORPUS_STORE_PATH)
+        print(f"📦 코퍼스 파일 저장: {CORPUS_STORE_PATH} ({len(store)}개 청크)")
+
+    print(f"📊 처리 결과:")
+    print(f"   - 처리한 행: {stats['rows']}개 (변경 없어 건너뜀: {stats['skipped_rows']}개)")
+    print(f"   - 총 청크: {count}개 (임베딩 토큰 약 {stats['tokens']:,}개, 토큰 예산 {CHUNK_TOKENS}/겹침 {OVERLAP_TOKENS})")
+    print(f"   - 중복 청크 제외: {stats['duplicates']}개")
+
+    if incremental:
+        print(f"✅ {count}개 청크 추가 완료 → {OUTPUT_FILE}")
+    else:
+        print(f"✅ {count}개 청크 저장 완료 → {OUTPUT_FILE}")
+    return {**stats, "written": count}
 
 
 if __name__ == "__main__":
-    prepare_chunks()
+    parser = argparse.ArgumentParser(description="CSV → 청크 JSONL 생성")
+    parser.add_argument("--incremental", action="store_true", help="새 글/수정된 글의 청크만 추가")
+    parser.add_argument("--workers", type=int, default=1, help="청크 분할 프로세스 수 (0: CPU 코어 수)")
+    args = parser.parse_args()
+    prepare_chunks(incremental=args.incremental, workers=args.workers or os.cpu_count() or 1)
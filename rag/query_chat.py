@@ -1,31 +1,155 @@
 import os
-from chromadb import PersistentClient
-from chromadb import Documents, EmbeddingFunction, Embeddings
-import google.generativeai as genai  
 import json
 from datetime import datetime, date, timedelta
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
 from typing import Optional
 import dotenv
+from rag.aho_corasick import PhraseMatcher
+from rag.answer_cache import AnswerCache, replay
+from rag.corpus_store import CORPUS_STORE_FILE, CorpusStore
+from rag.date_index import parse_date_string
+from rag.expansion_cache import ExpansionCache
+from rag.index_generations import current_index_dir
+from rag.index_snapshot import load_indexes
+from rag.metrics import RequestTrace
+from rag.text_analyzer import split_words
+from rag.vector_store import VECTOR_BACKEND, VECTOR_STORE_FILE, open_vector_index
 dotenv.load_dotenv()
 # ✅ 설정
 
 CHROMA_DIR = "rag/chroma_db"
 COLLECTION_NAME = "knou_chunks"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# API 키 전역 설정
-genai.configure(api_key=GEMINI_API_KEY)
+# 파이프라인 검색: 쿼리 확장(LLM)을 기다리지 않고 원본 질문 검색을 먼저 시작
+PIPELINED_RETRIEVAL = os.getenv("PIPELINED_RETRIEVAL", "true").lower() != "false"
+EXPANSION_BUDGET_S = float(os.getenv("EXPANSION_BUDGET_S", "2.5"))  # 확장 결과를 기다리는 최대 시간 (초)
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+# LLM 쿼리 확장 전용 스레드 수 (느린 확장 호출이 원본 질문 벡터 검색 스레드를 점유하지 않도록 분리)
+EXPANSION_WORKERS = int(os.getenv("EXPANSION_WORKERS", "4"))
+
+# ✅ 용어 규칙 테이블 (쿼리 전처리, 키워드 확장, 정확한 구문 매칭, LLM 확장 생략 판단에 공통 사용)
+# 용어 정규화 매핑: 일반 용어 → 공식 용어
+TERM_MAPPINGS = {
+    '학비': '등록금',
+    '등록비': '등록금', 
+    '학습비': '등록금',
+    '납부': '등록금 납부',
+    '장학': '장학금',
+    '성적우수': '성적우수장학',
+    '우수장학': '성적우수장학',
+    '수강': '수강신청',
+    '과목신청': '수강신청',
+    '시험': '출석시험',
+    '졸업': '졸업논문',
+    '2학기': '2025학년도 2학기',
+    '1학기': '2025학년도 1학기'
+}
+
+# 최신/최근 공지 요청 감지 단어 (최근 1주일 문서 우선 검색)
+LATEST_QUERY_WORDS = [
+    '최신', '최근', '새로운', '가장', '신규', '업데이트',
+    '이번주', '이번달', '오늘', '어제', '최신공지', '최근공지',
+    '새공지', '최신공고', '최근공고', '새공고', '최신소식'
+]
+
+# 최신성 관련 질문 감지 단어
+LATEST_TRIGGERS = ['최신', '최근', '새로운', '가장', '신규', '업데이트', '공지', '최신공지', '최근공지', '새공지']
+
+# (감지 단어, 추가할 키워드) 목록
+KEYWORD_EXPANSIONS = [
+    # 🔥 NEW: 최신성 관련 키워드 확장
+    (LATEST_TRIGGERS, [
+        '최신', '최근', '새로운', '신규', '업데이트', '공지',
+        '최신공지', '최근공지', '새공지'
+    ]),
+    # 등록금 관련 키워드 확장
+    (['등록', '학비', '납부', '등록금'], [
+        '등록금', '학비', '납부', '수납', '등록비', '학습비', 
+        '등록금납부', '등록금안내', '등록금수납', '등록'
+    ]),
+    # 장학금 관련 키워드 확장  
+    (['장학', '성적우수', '성적', '우수'], [
+        '장학금', '장학생', '성적우수장학', '성적우수', '장학',
+        '우수장학', '장학혜택', '장학선발', '장학안내'
+    ]),
+    # 수강 관련 키워드 확장
+    (['수강', '과목', '신청'], [
+        '수강신청', '과목신청', '수강', '과목', '신청',
+        '수강안내', '신청안내', '수강방법'
+    ]),
+    # 시험 관련 키워드 확장
+    (['시험', '평가', '출석'], [
+        '시험', '출석시험', '평가', '시험안내', '시험일정',
+        '기말시험', '중간시험', '시험방법'
+    ]),
+    # 시간 관련 키워드 확장
+    (['2025', '2학기', '1학기'], [
+        '2025학년도', '2025년', '2학기', '1학기',
+        '2025학년도 2학기', '2025학년도 1학기'
+    ]),
+]
+
+# 정확한 구문 매칭을 위한 핵심 구문 패턴들
+KEY_PHRASES = [
+    '등록금 납부', '등록금 안내', '등록금납부안내',
+    '장학금 선발', '성적우수장학', '장학생 선발',
+    '수강신청', '과목신청', '수강 안내',
+    '시험 안내', '출석시험', '시험일정',
+    '2025학년도 2학기', '2학기', '2025년 2학기'
+]
+
+# LLM 확장 생략 판단: 규칙 테이블 단어 + 의미 없는 질문 표현만으로 이루어진 짧은 질문
+RULE_COVERED_MAX_WORDS = 4
+RULE_TERMS = sorted(
+    set(TERM_MAPPINGS) | set(TERM_MAPPINGS.values())
+    | {term for triggers, expansions in KEYWORD_EXPANSIONS for term in triggers + expansions}
+)
+RULE_TERM_SET = frozenset(RULE_TERMS)
+
+# 위 규칙 테이블의 감지 단어/구문 전체를 하나의 Aho-Corasick 자동자로 컴파일 → 질문을 한 번만 훑어 모두 확인
+QUERY_TERM_MATCHER = PhraseMatcher(
+    list(TERM_MAPPINGS) + list(TERM_MAPPINGS.values())
+    + [trigger for triggers, _ in KEYWORD_EXPANSIONS for trigger in triggers]
+    + KEY_PHRASES + LATEST_QUERY_WORDS + RULE_TERMS
+)
+QUERY_TERM_CACHE_SIZE = 1024
+
+GENERIC_QUERY_WORDS = {
+    '언제', '어디', '어디서', '어떻게', '무엇', '뭐', '뭐야', '방법', '기간', '일정', '안내', '정보',
+    '알려줘', '알려주세요', '궁금해', '궁금합니다', '확인', '문의', '마감', '날짜',
+}
+
+_genai = None
+
+
+@lru_cache(maxsize=QUERY_TERM_CACHE_SIZE)
+def query_terms(text: str) -> frozenset:
+    """텍스트(소문자 기준)에 포함된 규칙 테이블 단어/구문 전체 (전처리, 키워드 확장, 구문 추출이 같은 결과를 공유)"""
+    return frozenset(QUERY_TERM_MATCHER.find(text.lower()))
+
+def load_genai():
+    """google.generativeai는 처음 필요할 때 import + API 키 설정 (서버 모듈 로드 시간 단축)"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
 
 # ✅ Gemini 임베딩 함수 (최신 API 방식)
-class GeminiEmbeddingFunction(EmbeddingFunction):
+# chromadb의 EmbeddingFunction 프로토콜과 같은 __call__(self, input) 형식 → chromadb import 없이 정의
+class GeminiEmbeddingFunction:
     def __init__(self):
         self.model = "models/text-embedding-004"
     
-    def __call__(self, input: Documents) -> Embeddings:
+    def __call__(self, input: list) -> list:
         try:
             # 배치 임베딩 요청
-            result = genai.embed_content(
+            result = load_genai().embed_content(
                 model=self.model,
                 content=input,
                 task_type="retrieval_document"
@@ -36,102 +160,148 @@ class GeminiEmbeddingFunction(EmbeddingFunction):
             return [[0.0] * 768 for _ in input]
 
 class KNOUChatbot:
-    def __init__(self):
+    def __init__(self, chroma_client=None, embedding_func=None, gen_model=None, expansion_cache=None,
+                 index_dir: Optional[str] = None, vector_backend: str = VECTOR_BACKEND):
+        """인자를 넘기지 않으면 운영 설정(CHROMA_DIR의 현재 색인 세대, Gemini) 사용, 벤치마크에서는 로컬 대체 객체 주입
+
+        index_dir: Chroma DB, 코퍼스 파일, 벡터 파일이 있는 색인 세대 디렉토리
+        """
         print("🤖 KNOU 챗봇을 초기화하는 중...")
-        
-        # ChromaDB 클라이언트 초기화
-        self.chroma_client = PersistentClient(path=CHROMA_DIR)
-        self.embedding_func = GeminiEmbeddingFunction()
-        
-        # 컬렉션 로드
-        try:
-            self.collection = self.chroma_client.get_collection(
-                name=COLLECTION_NAME,
-                embedding_function=self.embedding_func
-            )
-            print(f"✅ 컬렉션 로드 완료: {self.collection.count()}개 청크")
-        except Exception as e:
-            print(f"❌ 컬렉션 로드 실패: {e}")
-            return
+        self.index_dir = index_dir or current_index_dir(CHROMA_DIR)
+        
+        # ChromaDB 클라이언트 (넘기지 않으면 처음 컬렉션이 필요할 때 생성)
+        self._owns_client = chroma_client is None
+        self.chroma_client = chroma_client
+        self._collection = None
+        self._collection_lock = threading.Lock()
+        self.embedding_func = embedding_func or GeminiEmbeddingFunction()
+        # 검색 단계 병렬 실행용 스레드 풀 (스레드는 첫 작업 제출 시 생성됨)
+        # 원본 질문 벡터 검색(지연 시간 중요)과 LLM 쿼리 확장(느리고 시간 초과 후에도 계속 실행)은 풀을 분리
+        self.search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+        self.expansion_executor = ThreadPoolExecutor(max_workers=EXPANSION_WORKERS, thread_name_prefix="expansion")
+        # chromadb 0.4.x 컬렉션 호출은 스레드 안전하지 않음 (내부 텔레메트리 배치 처리에서 KeyError)
+        # → 동시 요청/병렬 검색 단계에서 컬렉션 호출만 직렬화 (임베딩 API 호출은 잠금 밖에서 실행)
+        self.chroma_lock = threading.Lock()
+        
+        corpus_store_path = os.path.join(self.index_dir, CORPUS_STORE_FILE)
+        self.vector_index = None
+        # 로컬 벡터 검색: 코퍼스 파일과 벡터 파일이 같은 청크 집합이면 Chroma를 열지 않고 시작
+        if not (vector_backend == "local" and self._load_local_index(corpus_store_path)):
+            # 컬렉션 로드
+            try:
+                print(f"✅ 컬렉션 로드 완료: {self.collection.count()}개 청크")
+            except Exception as e:
+                print(f"❌ 컬렉션 로드 실패: {e}")
+                return
+            
+            # 문서/메타데이터를 한 번만 불러와 키워드 역색인과 날짜 색인 구축
+            collection_ids = self.collection.get(include=[])['ids']
+            self._load_corpus(self._open_corpus_store(corpus_store_path, collection_ids))
+            # 로컬 벡터 검색 (메모리 매핑한 임베딩 행렬), 사용할 수 없으면 None → Chroma 검색
+            if vector_backend == "local":
+                self.vector_index = open_vector_index(os.path.join(self.index_dir, VECTOR_STORE_FILE), collection_ids)
+        
+        # 반복되는 질문은 검색/생성 없이 저장된 답변을 재사용
+        self.answer_cache = AnswerCache()
+        # LLM 쿼리 확장 결과 캐시 (파일 기반, 날짜별)
+        self.expansion_cache = expansion_cache or ExpansionCache()
         
         # Gemini 생성 모델 (최신 방식)
-        self.gen_model = genai.GenerativeModel("gemini-1.5-flash")
+        self.gen_model = gen_model or load_genai().GenerativeModel("gemini-1.5-flash")
         
         print("🎯 KNOU 챗봇 준비 완료!\n")
 
-    def _parse_date_string(self, date_str: str) -> Optional[date]:
-        """Helper to parse various date string formats into a date object."""
-        if not date_str:
-            return None
-        
-        # 데이터의 주요 연도는 2025년이므로 기준으로 설정
-        context_year = 2025 
-
-        # Handle ranges, use start date
-        if "~" in date_str:
-            date_str = date_str.split("~")[0].strip()
-
-        # Try common formats
-        date_formats = [
-            "%Y-%m-%d",      # 2025-07-16
-            "%Y.%m.%d",      # 2025.07.16  
-            "%Y/%m/%d",      # 2025/07/16
-        ]
-        
-        dt_obj = None
-        for fmt in date_formats:
+    @classmethod
+    def for_index(cls, index_dir: str, vector_backend: str = VECTOR_BACKEND) -> "KNOUChatbot":
+        """색인 세대 디렉토리로 챗봇 생성 (컬렉션을 불러오지 못하면 예외 → 세대 교체 취소)"""
+        chatbot = cls(index_dir=index_dir, vector_backend=vector_backend)
+        if not hasattr(chatbot, "corpus"):
+            chatbot.close()
+            raise RuntimeError(f"색인을 불러오지 못했습니다: {index_dir}")
+        return chatbot
+
+    @property
+    def collection(self):
+        """Chroma 컬렉션 (로컬 색인만으로 시작한 경우 Chroma 검색/폴백이 처음 필요할 때 연결)"""
+        if self._collection is None:
+            with self._collection_lock:
+                if self._collection is None:
+                    if self.chroma_client is None:
+                        from chromadb import PersistentClient
+                        self.chroma_client = PersistentClient(path=self.index_dir)
+                    self._collection = self.chroma_client.get_collection(
+                        name=COLLECTION_NAME,
+                        embedding_function=self.embedding_func
+                    )
+        return self._collection
+
+    def close(self):
+        """교체된 이전 세대 정리: 검색 스레드 풀 종료 + 이 세대의 Chroma 시스템 해제"""
+        self.search_executor.shutdown(wait=False)
+        self.expansion_executor.shutdown(wait=False)
+        if self._owns_client and self.chroma_client is not None:
             try:
-                dt_obj = datetime.strptime(date_str, fmt).date()
-                return dt_obj
-            except ValueError:
-                continue
-        
-        # Try partial formats (e.g., "07.25", "07/25")
+                # chromadb 0.4.x는 경로별 시스템을 프로세스 전역에 캐시 → 직접 꺼내서 종료
+                from chromadb.api.client import SharedSystemClient
+                system = SharedSystemClient._identifer_to_system.pop(self.chroma_client._identifier, None)
+                if system is not None:
+                    system.stop()
+            except Exception as e:
+                print(f"⚠️ 이전 색인 정리 중 오류: {e}")
+        print(f"🧹 이전 색인 세대 닫음: {self.index_dir}")
+
+    def _load_local_index(self, corpus_store_path: str) -> bool:
+        """코퍼스 파일 + 벡터 파일로 시작 (둘 다 같은 세대에서 컬렉션 기준으로 만들어지므로 id가 같으면 컬렉션과 일치)"""
+        vector_store_path = os.path.join(self.index_dir, VECTOR_STORE_FILE)
+        if not (os.path.exists(corpus_store_path) and os.path.exists(vector_store_path)):
+            return False
         try:
-            # "07.25" format
-            if len(date_str.split('.')) == 2:
-                month, day = map(int, date_str.split('.'))
-                current_date = date.today()
-                current_year = current_date.year
-                
-                # 먼저 현재 연도로 시도
-                try:
-                    candidate_date = date(current_year, month, day)
-                    # 현재 날짜와의 차이가 6개월 이내면 현재 연도 사용
-                    days_diff = abs((current_date - candidate_date).days)
-                    if days_diff <= 180:  # 6개월
-                        return candidate_date
-                    # 미래 날짜가 너무 멀면 작년
-                    elif candidate_date > current_date:
-                        return date(current_year - 1, month, day)
-                    # 과거 날짜가 너무 멀면 내년
-                    else:
-                        return date(current_year + 1, month, day)
-                except ValueError:
-                    return date(current_year, month, day)
-                    
-            # "07/25" format
-            elif len(date_str.split('/')) == 2:
-                month, day = map(int, date_str.split('/'))
-                current_date = date.today()
-                current_year = current_date.year
-                
-                # 동일한 로직 적용
-                try:
-                    candidate_date = date(current_year, month, day)
-                    days_diff = abs((current_date - candidate_date).days)
-                    if days_diff <= 180:  # 6개월
-                        return candidate_date
-                    elif candidate_date > current_date:
-                        return date(current_year - 1, month, day)
-                    else:
-                        return date(current_year + 1, month, day)
-                except ValueError:
-                    return date(current_year, month, day)
-        except (ValueError, TypeError):
-            pass
-            
-        return None
+            corpus = CorpusStore.load(corpus_store_path)
+        except Exception as e:
+            print(f"⚠️ 코퍼스 파일 로드 실패 ({e}), 컬렉션에서 불러옵니다.")
+            return False
+        vector_index = open_vector_index(vector_store_path, corpus.ids())
+        if vector_index is None:
+            return False
+        print(f"📦 코퍼스 파일 로드: {corpus_store_path} ({len(corpus)}개 청크, Chroma는 필요할 때 연결)")
+        self.vector_index = vector_index
+        self._load_corpus(corpus)
+        return True
+
+    def _open_corpus_store(self, path: str, collection_ids: list) -> CorpusStore:
+        """열 단위 코퍼스 파일 로드 (없거나 컬렉션과 청크 id가 다르면 컬렉션 전체를 한 번 불러와 구축)"""
+        if path and os.path.exists(path):
+            try:
+                store = CorpusStore.load(path)
+                # 임베딩이 실패해 컬렉션이 코퍼스 파일보다 뒤처진 경우 등 → 컬렉션 기준 사용
+                if len(collection_ids) == len(store) and all(store.position(doc_id) is not None for doc_id in collection_ids):
+                    print(f"📦 코퍼스 파일 로드: {path} ({len(store)}개 청크)")
+                    return store
+                print(f"⚠️ 코퍼스 파일({len(store)}개)이 컬렉션({len(collection_ids)}개)과 달라 컬렉션에서 불러옵니다.")
+            except Exception as e:
+                print(f"⚠️ 코퍼스 파일 로드 실패 ({e}), 컬렉션에서 불러옵니다.")
+        all_docs = self.collection.get(include=["documents", "metadatas"])
+        return CorpusStore.from_collection_data(all_docs['ids'], all_docs['documents'], all_docs['metadatas'])
+
+    def _load_corpus(self, corpus: CorpusStore):
+        """키워드 역색인(BM25)과 날짜 정렬 색인 준비 (코퍼스 파일 옆의 스냅샷이 있으면 구축 없이 로드)"""
+        start = time.perf_counter()
+        self.corpus = corpus
+        self.keyword_index, self.date_index = load_indexes(corpus)
+        # 핵심 구문이 들어간 제목 미리 계산 (fork 전에 한 번 → 워커들이 공유)
+        self.keyword_index.match_phrases([phrase.lower() for phrase in KEY_PHRASES])
+
+        elapsed = time.perf_counter() - start
+        print(f"🔑 키워드 색인 준비 완료: {len(self.keyword_index)}개 문서, {self.keyword_index.vocabulary_size}개 용어 ({elapsed:.2f}초)")
+        print(f"📅 날짜 색인 준비 완료: {len(self.date_index)}개 문서 ({self.date_index.oldest()} ~ {self.date_index.latest()})")
+
+    def _corpus_results(self, positions: list) -> dict:
+        """문서 위치 목록을 Chroma 검색 결과 형식으로 변환"""
+        return self.corpus.results(positions)
+
+    def _parse_date_string(self, date_str: str) -> Optional[date]:
+        """Helper to parse various date string formats into a date object."""
+        return parse_date_string(date_str)
 
     def extract_query_date(self, query: str) -> Optional[date]:
         """Extracts a specific date (month and day) from the user query."""
@@ -149,57 +319,47 @@ class KNOUChatbot:
 
     def is_latest_query(self, query: str) -> bool:
         """사용자가 최신/최근 공지를 요청하는지 판단"""
-        latest_keywords = [
-            '최신', '최근', '새로운', '가장', '신규', '업데이트', 
-            '이번주', '이번달', '오늘', '어제', '최신공지', '최근공지', 
-            '새공지', '최신공고', '최근공고', '새공고', '최신소식'
-        ]
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in latest_keywords)
+        terms = query_terms(query)
+        return any(keyword in terms for keyword in LATEST_QUERY_WORDS)
     
+    def is_rule_covered_query(self, query: str) -> bool:
+        """규칙 테이블(용어 매핑/키워드 확장)로 충분히 처리되는 짧은 키워드형 질문인지 판단
+
+        예: "2학기 등록금 납부 기간은?" → LLM 확장 없이 검색
+        """
+        words = split_words(query)
+        if not words or len(words) > RULE_COVERED_MAX_WORDS:
+            return False
+        has_rule_term = False
+        for word in words:
+            if query_terms(word) & RULE_TERM_SET:
+                has_rule_term = True
+            elif word not in GENERIC_QUERY_WORDS:
+                return False
+        return has_rule_term
+
     def get_recent_documents(self, days_back: int = 7) -> list:
         """최근 N일 이내의 문서들을 날짜순으로 가져오기"""
         try:
             today = date.today()
             cutoff_date = today - timedelta(days=days_back)
             
-            all_docs_data = self.collection.get(include=["documents", "metadatas"])
-            recent_docs = []
+            # 날짜 색인에서 cutoff 이후 구간만 bisect로 조회
+            recent_positions = self.date_index.between(start=cutoff_date)
             
-            for i in range(len(all_docs_data['ids'])):
-                meta = all_docs_data['metadatas'][i]
-                doc_date_str = meta.get('date')
-                doc_type = meta.get('type')
-                
-                # notice 타입만 필터링 (schedule 제외)
-                if doc_type != 'notice':
-                    continue
-                
-                if doc_date_str:
-                    parsed_doc_date = self._parse_date_string(doc_date_str)
-                    if parsed_doc_date and parsed_doc_date >= cutoff_date:
-                        recent_docs.append({
-                            'id': all_docs_data['ids'][i],
-                            'document': all_docs_data['documents'][i],
-                            'metadata': meta,
-                            'parsed_date': parsed_doc_date
-                        })
+            # notice 타입만 필터링 (schedule 제외)
+            recent_docs = [
+                pos for pos in recent_positions
+                if self.corpus.field('type', pos) == 'notice'
+            ]
             
-            # 날짜순으로 정렬 (최신순)
-            recent_docs.sort(key=lambda x: x['parsed_date'], reverse=True)
+            # 날짜순으로 정렬 (최신순, 같은 날짜는 저장 순서 유지)
+            recent_docs.sort(key=lambda pos: (-self.date_index.ordinal_of(pos), pos))
             
             print(f"📅 최근 {days_back}일 이내 공지: {len(recent_docs)}개 발견")
             
             if recent_docs:
-                final_ids = [d['id'] for d in recent_docs[:10]]  # 상위 10개만
-                final_docs = [d['document'] for d in recent_docs[:10]]
-                final_metas = [d['metadata'] for d in recent_docs[:10]]
-                
-                return {
-                    'ids': [final_ids],
-                    'documents': [final_docs],
-                    'metadatas': [final_metas]
-                }
+                return self._corpus_results(recent_docs[:10])  # 상위 10개만
             
             return None
             
@@ -210,19 +370,11 @@ class KNOUChatbot:
     def get_data_date_info(self):
         """시스템 데이터의 날짜 범위 정보 가져오기"""
         try:
-            all_data = self.collection.get(include=['metadatas'])
-            dates = set()
-            
-            for meta in all_data['metadatas']:
-                if meta and meta.get('date'):
-                    dates.add(meta['date'])
-            
-            if dates:
-                sorted_dates = sorted(dates)
+            if len(self.date_index):
                 return {
-                    'latest': sorted_dates[-1],
-                    'oldest': sorted_dates[0],
-                    'total_dates': len(sorted_dates)
+                    'latest': self.date_index.latest().strftime("%Y-%m-%d"),
+                    'oldest': self.date_index.oldest().strftime("%Y-%m-%d"),
+                    'total_dates': self.date_index.distinct_count
                 }
             return None
         except Exception as e:
@@ -232,26 +384,10 @@ class KNOUChatbot:
     def preprocess_query(self, query: str) -> str:
         """🚀 빠른 개선: 쿼리 전처리 - 일반 용어를 공식 용어로 변환"""
         
-        # 용어 정규화 매핑
-        term_mappings = {
-            '학비': '등록금',
-            '등록비': '등록금', 
-            '학습비': '등록금',
-            '납부': '등록금 납부',
-            '장학': '장학금',
-            '성적우수': '성적우수장학',
-            '우수장학': '성적우수장학',
-            '수강': '수강신청',
-            '과목신청': '수강신청',
-            '시험': '출석시험',
-            '졸업': '졸업논문',
-            '2학기': '2025학년도 2학기',
-            '1학기': '2025학년도 1학기'
-        }
-        
         enhanced_query = query
-        for original, replacement in term_mappings.items():
-            if original in query and replacement not in query:
+        terms = query_terms(query)
+        for original, replacement in TERM_MAPPINGS.items():
+            if original in terms and replacement not in terms:
                 enhanced_query = enhanced_query.replace(original, f"{original} {replacement}")
         
         return enhanced_query
@@ -259,78 +395,38 @@ class KNOUChatbot:
     def get_enhanced_keywords(self, query: str) -> set:
         """🚀 빠른 개선: 대폭 확장된 키워드 매핑"""
         
-        query_lower = query.lower()
-        enhanced_keywords = set(query_lower.split())
-        
-        # 🔥 NEW: 최신성 관련 키워드 확장
-        if any(word in query_lower for word in ['최신', '최근', '새로운', '가장', '신규', '업데이트', '공지', '최신공지', '최근공지', '새공지']):
-            enhanced_keywords.update([
-                '최신', '최근', '새로운', '신규', '업데이트', '공지',
-                '최신공지', '최근공지', '새공지'
-            ])
-        
-        # 등록금 관련 키워드 확장
-        if any(word in query_lower for word in ['등록', '학비', '납부', '등록금']):
-            enhanced_keywords.update([
-                '등록금', '학비', '납부', '수납', '등록비', '학습비', 
-                '등록금납부', '등록금안내', '등록금수납', '등록'
-            ])
-        
-        # 장학금 관련 키워드 확장  
-        if any(word in query_lower for word in ['장학', '성적우수', '성적', '우수']):
-            enhanced_keywords.update([
-                '장학금', '장학생', '성적우수장학', '성적우수', '장학',
-                '우수장학', '장학혜택', '장학선발', '장학안내'
-            ])
-        
-        # 수강 관련 키워드 확장
-        if any(word in query_lower for word in ['수강', '과목', '신청']):
-            enhanced_keywords.update([
-                '수강신청', '과목신청', '수강', '과목', '신청',
-                '수강안내', '신청안내', '수강방법'
-            ])
+        terms = query_terms(query)
+        # 조사를 뗀 단어 단위 (예: "등록금을" → "등록금")
+        enhanced_keywords = set(split_words(query))
         
-        # 시험 관련 키워드 확장
-        if any(word in query_lower for word in ['시험', '평가', '출석']):
-            enhanced_keywords.update([
-                '시험', '출석시험', '평가', '시험안내', '시험일정',
-                '기말시험', '중간시험', '시험방법'
-            ])
-        
-        # 시간 관련 키워드 확장
-        if any(word in query_lower for word in ['2025', '2학기', '1학기']):
-            enhanced_keywords.update([
-                '2025학년도', '2025년', '2학기', '1학기',
-                '2025학년도 2학기', '2025학년도 1학기'
-            ])
+        for triggers, expansions in KEYWORD_EXPANSIONS:
+            if any(word in terms for word in triggers):
+                enhanced_keywords.update(expansions)
         
         return enhanced_keywords
     
     def get_exact_phrases(self, query: str) -> list:
         """🚀 빠른 개선: 정확한 구문 매칭을 위한 핵심 구문 추출"""
         
-        exact_phrases = []
-        query_lower = query.lower()
-        
-        # 핵심 구문 패턴들
-        key_phrases = [
-            '등록금 납부', '등록금 안내', '등록금납부안내',
-            '장학금 선발', '성적우수장학', '장학생 선발',
-            '수강신청', '과목신청', '수강 안내',
-            '시험 안내', '출석시험', '시험일정',
-            '2025학년도 2학기', '2학기', '2025년 2학기'
-        ]
-        
-        for phrase in key_phrases:
-            if phrase in query_lower:
-                exact_phrases.append(phrase)
-        
-        return exact_phrases
+        terms = query_terms(query)
+        return [phrase for phrase in KEY_PHRASES if phrase in terms]
+
+    def _dated_query(self, query: str) -> str:
+        """벡터 검색용 원본 질문 (오늘 날짜 포함)"""
+        return f"[오늘: {date.today().strftime('%Y-%m-%d')}] {query}"
 
-    def expand_query(self, query: str) -> list[str]:
+    def expand_query(self, query: str, use_llm: bool = True) -> list[str]:
         """LLM을 사용해 검색을 위한 다양한 질문 생성 (오늘 날짜 자동 포함)"""
         
         today = date.today().strftime("%Y-%m-%d")
+        if not use_llm:
+            print("⚡ 규칙 테이블로 처리되는 질문, LLM 쿼리 확장 생략")
+            return [self._dated_query(query)]
+        
+        cached = self.expansion_cache.get(query)
+        if cached is not None:
+            print(f"💾 쿼리 확장 캐시 사용 ({len(cached)}개)")
+            return [self._dated_query(query)] + cached
         
         prompt = f"""당신은 벡터 검색에 최적화된 질문을 생성하는 전문가입니다. 사용자의 질문을 받아서, 그 의미를 다양한 각도에서 포착할 수 있는 3개의 구체적인 질문으로 재작성해주세요.
 
@@ -347,15 +443,15 @@ class KNOUChatbot:
             
             expanded_queries = [line.strip().split('. ', 1)[1] for line in response.text.strip().split('\n') if '. ' in line]
             
-            enhanced_query = f"[오늘: {today}] {query}"
-            all_queries = [enhanced_query] + expanded_queries
+            if expanded_queries:
+                self.expansion_cache.put(query, expanded_queries)
+            all_queries = [self._dated_query(query)] + expanded_queries
             print(f"💡 쿼리 확장 (오늘: {today}): {all_queries[0]}")
             return all_queries
 
         except Exception as e:
             print(f"⚠️ 쿼리 확장 실패 ({e}), 원본 질문만 사용합니다.")
-            enhanced_query = f"[오늘: {today}] {query}"
-            return [enhanced_query]
+            return [self._dated_query(query)]
     
     def calculate_date_weight(self, doc_date: str, current_date: str = None) -> float:
         """날짜 기반 가중치 계산 - 최신 문서일수록 높은 가중치"""
@@ -394,8 +490,96 @@ class KNOUChatbot:
             print(f"⚠️ 날짜 처리 오류 ({doc_date}): {e}")
             return 0.3  # 기본 가중치
 
-    def search_documents(self, query: str, n_results: int = 5):
-        """하이브리드 검색: LLM쿼리확장(Vector)과 키워드(Full-text) 검색을 RRF로 결합 + 날짜 기반 정렬"""
+    def _timed_expand_query(self, query: str, use_llm: bool, trace: RequestTrace) -> list:
+        start = time.perf_counter()
+        expanded_queries = self.expand_query(query, use_llm)
+        trace.record("expansion", time.perf_counter() - start, queries=len(expanded_queries), llm=int(use_llm))
+        return expanded_queries
+
+    def retrieval_query(self, query: str) -> str:
+        """원본 질문 벡터 검색에 쓰는 텍스트 (답변 캐시의 유사 질문 비교도 같은 임베딩을 재사용)"""
+        return self._dated_query(self.preprocess_query(query))
+
+    def _embed_queries(self, queries: list, query_embeddings: Optional[dict] = None) -> list:
+        """질문 임베딩 (query_embeddings에 이미 계산한 질문은 재사용, 새로 계산한 결과는 저장)"""
+        if query_embeddings is None:
+            return self.embedding_func(list(queries))
+        missing = [text for text in dict.fromkeys(queries) if text not in query_embeddings]
+        if missing:
+            query_embeddings.update(zip(missing, self.embedding_func(missing)))
+        return [query_embeddings[text] for text in queries]
+
+    def _pipelined_vector_search(self, enhanced_query: str, n_results: int, use_llm: bool, trace: RequestTrace,
+                                 query_embeddings: Optional[dict] = None):
+        """원본 질문 벡터 검색과 쿼리 확장을 동시에 시작 → (벡터 검색 대기 함수)
+
+        키워드 검색을 하는 동안 두 작업이 진행되고, 반환된 함수를 호출하면 원본 질문
+        결과에 시간 예산(EXPANSION_BUDGET_S) 안에 도착한 확장 질문 결과를 합칩니다.
+        확장은 별도 풀(expansion_executor)에서 실행 → 느린 LLM 호출이 밀려도 원본 질문 검색은 기다리지 않음
+        """
+        started = time.perf_counter()
+        expansion_future = self.expansion_executor.submit(self._timed_expand_query, enhanced_query, use_llm, trace)
+        base_future = self.search_executor.submit(self._vector_search, [self._dated_query(enhanced_query)], n_results, trace,
+                                                  query_embeddings=query_embeddings)
+
+        def collect() -> dict:
+            vector_search_results = base_future.result()
+            remaining = EXPANSION_BUDGET_S - (time.perf_counter() - started)
+            try:
+                expanded_queries = expansion_future.result(timeout=max(0.0, remaining))
+            except FutureTimeoutError:
+                # 아직 시작하지 못하고 대기 중인 확장은 취소 → 결과를 쓰지 않을 LLM 호출로 풀이 밀리지 않게
+                expansion_future.cancel()
+                print(f"⏱️ 쿼리 확장이 {EXPANSION_BUDGET_S}초 안에 끝나지 않아 원본 질문 결과만 사용합니다.")
+                trace.registry.inc("knou_expansion_timeouts_total")
+                return vector_search_results
+
+            # 첫 항목은 이미 검색한 원본 질문 → 나머지 확장 질문만 추가 검색
+            expansion_results = self._vector_search(expanded_queries[1:], n_results, trace, stage="vector_expansion")
+            for doc_id, rank in expansion_results.items():
+                vector_search_results.setdefault(doc_id, rank)
+            return vector_search_results
+
+        return collect
+
+    def _vector_search(self, queries: list, n_results: int, trace: RequestTrace, stage: str = "vector",
+                       query_embeddings: Optional[dict] = None) -> dict:
+        """여러 질문을 한 번의 배치 임베딩 요청과 한 번의 다중 질의 검색으로 처리 → {doc_id: rank}
+
+        query_embeddings: 같은 요청에서 이미 계산한 질문 임베딩 (답변 캐시 조회 때 계산한 원본 질문 등)
+        """
+        vector_search_results = {}  # {doc_id: rank}
+        if not queries:
+            return vector_search_results
+        start = time.perf_counter()
+        try:
+            embeddings = self._embed_queries(queries, query_embeddings)
+            if self.vector_index is not None:
+                # 읽기 전용 행렬 연산 → 잠금 없이 동시 실행
+                results = self.vector_index.query(embeddings, n_results, include_distances=False)
+            else:
+                with self.chroma_lock:
+                    results = self.collection.query(query_embeddings=embeddings, n_results=n_results)
+        except Exception as e:
+            print(f"❌ 벡터 검색 중 오류: {e}")
+            trace.record(stage, time.perf_counter() - start, queries=len(queries), candidates=0)
+            return vector_search_results
+
+        for i, ids in enumerate(results['ids']):
+            print(f"   벡터 검색 {i+1}: {len(ids)}개 결과")
+            for rank, doc_id in enumerate(ids):
+                if doc_id not in vector_search_results:
+                    vector_search_results[doc_id] = rank + 1 # 랭크는 1부터 시작
+        trace.record(stage, time.perf_counter() - start, queries=len(queries), candidates=len(vector_search_results))
+        return vector_search_results
+
+    def search_documents(self, query: str, n_results: int = 5, trace: RequestTrace = None,
+                         query_embeddings: Optional[dict] = None):
+        """하이브리드 검색: LLM쿼리확장(Vector)과 키워드(Full-text) 검색을 RRF로 결합 + 날짜 기반 정렬
+
+        query_embeddings: {질문 텍스트: 임베딩} 요청 단위 메모 (이미 계산한 임베딩은 다시 요청하지 않음)
+        """
+        trace = trace or RequestTrace()
 
         # 🔥 NEW: 최신 공지 요청 우선 처리
         if self.is_latest_query(query):
@@ -411,33 +595,12 @@ class KNOUChatbot:
         if query_date:
             print(f"🎯 특정 날짜 쿼리 감지: {query_date.strftime('%Y-%m-%d')}")
             try:
-                all_docs_data = self.collection.get(include=["documents", "metadatas"])
-                
-                matched_docs = []
-                for i in range(len(all_docs_data['ids'])):
-                    meta = all_docs_data['metadatas'][i]
-                    doc_date_str = meta.get('date')
-                    if doc_date_str:
-                        parsed_doc_date = self._parse_date_string(doc_date_str)
-                        if parsed_doc_date and parsed_doc_date == query_date:
-                            matched_docs.append({
-                                'id': all_docs_data['ids'][i],
-                                'document': all_docs_data['documents'][i],
-                                'metadata': meta
-                            })
+                # 날짜 색인에서 해당 날짜 구간만 bisect로 조회
+                matched_docs = self.date_index.on(query_date)
                 
                 if matched_docs:
                     print(f"✨ 날짜가 정확히 일치하는 {len(matched_docs)}개의 문서를 찾았습니다. 우선적으로 반환합니다.")
-                    
-                    final_ids = [d['id'] for d in matched_docs]
-                    final_docs = [d['document'] for d in matched_docs]
-                    final_metas = [d['metadata'] for d in matched_docs]
-                    
-                    return {
-                        'ids': [final_ids],
-                        'documents': [final_docs],
-                        'metadatas': [final_metas]
-                    }
+                    return self._corpus_results(matched_docs)
                 else:
                     print(f"ℹ️ 날짜({query_date.strftime('%Y-%m-%d')})와 일치하는 문서는 없으나, 관련 내용을 계속 검색합니다.")
 
@@ -449,66 +612,52 @@ class KNOUChatbot:
         
         # 🚀 빠른 개선: 쿼리 전처리 및 키워드 확장
         enhanced_query = self.preprocess_query(query)
+        # 규칙 테이블로 충분한 짧은 질문은 LLM 확장 호출 생략
+        use_llm = not self.is_rule_covered_query(query)
         
         # --- 1단계: 의미 기반 벡터 검색 (Query Expansion 사용) ---
         print("1️⃣  의미 기반 검색 실행...")
-        expanded_queries = self.expand_query(enhanced_query)
-        vector_search_results = {}  # {doc_id: rank}
-
-        for i, exp_query in enumerate(expanded_queries):
-            try:
-                results = self.collection.query(query_texts=[exp_query], n_results=n_results)
-                print(f"   벡터 검색 {i+1}: {len(results['ids'][0])}개 결과")
-                for rank, doc_id in enumerate(results['ids'][0]):
-                    if doc_id not in vector_search_results:
-                        vector_search_results[doc_id] = rank + 1 # 랭크는 1부터 시작
-            except Exception as e:
-                print(f"❌ '{exp_query}' 벡터 검색 중 오류: {e}")
-        
-        print(f"   벡터 검색 총 {len(vector_search_results)}개 고유 문서")
+        if PIPELINED_RETRIEVAL:
+            # 쿼리 확장과 원본 질문 벡터 검색은 백그라운드에서, 키워드 검색은 그동안 이 스레드에서 실행
+            collect_vector_results = self._pipelined_vector_search(enhanced_query, n_results, use_llm, trace,
+                                                                   query_embeddings)
+        else:
+            expanded_queries = self._timed_expand_query(enhanced_query, use_llm, trace)
+            vector_search_results = self._vector_search(expanded_queries, n_results, trace,
+                                                        query_embeddings=query_embeddings)
         
         # --- 2단계: 강화된 키워드 기반 텍스트 검색 ---
         print("2️⃣  강화된 키워드 기반 검색 실행...")
         keyword_search_results = {} # {doc_id: rank}
+        stage_start = time.perf_counter()
         try:
-            all_docs = self.collection.get(include=["documents", "metadatas"]) 
-            
             # 🚀 빠른 개선: 대폭 확장된 키워드 매핑
             enhanced_keywords = self.get_enhanced_keywords(enhanced_query)
+            exact_phrases = self.get_exact_phrases(enhanced_query)
             
             print(f"🔑 확장된 키워드: {list(enhanced_keywords)[:8]}...")
             
-            scores = []
-            for doc_id, document, metadata in zip(all_docs['ids'], all_docs['documents'], all_docs['metadatas']):
-                doc_lower = document.lower()
-                title_lower = metadata.get('title', '').lower() if metadata else ''
-                
-                # 🚀 빠른 개선: 제목 가중치 대폭 증가 (2배 → 5배)
-                content_matches = sum(1 for term in enhanced_keywords if term in doc_lower)
-                title_matches = sum(1 for term in enhanced_keywords if term in title_lower) * 5  # 제목 매칭 가중치 증가
-                
-                # 🚀 빠른 개선: 정확한 구문 매칭 보너스
-                exact_phrase_bonus = 0
-                if any(phrase in title_lower for phrase in self.get_exact_phrases(enhanced_query)):
-                    exact_phrase_bonus = 10  # 정확한 구문 매칭 시 높은 보너스
-                
-                total_score = content_matches + title_matches + exact_phrase_bonus
-                
-                if total_score > 0:
-                    scores.append({'id': doc_id, 'score': total_score})
+            # 역색인에서 질의 용어(bigram id)의 posting만 조회 (BM25, 제목 가중치 + 정확한 구문 보너스)
+            sorted_by_score = self.keyword_index.search(enhanced_keywords, exact_phrases)
+            for rank, (doc_id, _) in enumerate(sorted_by_score):
+                keyword_search_results[doc_id] = rank + 1
             
-            # 점수 순으로 정렬하여 랭크 부여
-            sorted_by_score = sorted(scores, key=lambda x: x['score'], reverse=True)
-            for rank, item in enumerate(sorted_by_score):
-                keyword_search_results[item['id']] = rank + 1
-            
-            print(f"   키워드 검색 총 {len(keyword_search_results)}개 문서 (상위 점수: {sorted_by_score[0]['score'] if sorted_by_score else 0})")
+            print(f"   키워드 검색 총 {len(keyword_search_results)}개 문서 (상위 점수: {sorted_by_score[0][1] if sorted_by_score else 0:.2f})")
 
         except Exception as e:
             print(f"❌ 키워드 검색 중 오류: {e}")
+        trace.record("keyword", time.perf_counter() - stage_start, candidates=len(keyword_search_results))
+
+        if PIPELINED_RETRIEVAL:
+            stage_start = time.perf_counter()
+            vector_search_results = collect_vector_results()
+            # 키워드 검색이 끝난 뒤 벡터 검색/쿼리 확장을 추가로 기다린 시간
+            trace.record("vector_wait", time.perf_counter() - stage_start)
+        print(f"   벡터 검색 총 {len(vector_search_results)}개 고유 문서")
 
         # --- 3단계: RRF (Reciprocal Rank Fusion) 로 결과 재정렬 ---
         print("3️⃣  RRF로 결과 재정렬...")
+        stage_start = time.perf_counter()
         fused_scores = {}
         k = 60  # RRF의 기본 상수
         vector_weight = 1.0
@@ -526,13 +675,16 @@ class KNOUChatbot:
         sorted_fused_ids = sorted(fused_scores.keys(), key=lambda x: fused_scores[x], reverse=True)
         
         print(f"   RRF 융합 결과: {len(sorted_fused_ids)}개 문서")
+        trace.record("rrf", time.perf_counter() - stage_start, candidates=len(sorted_fused_ids))
         
         if not sorted_fused_ids:
             return None # 결과가 없으면 None 반환
 
         # 최종 상위 n_results개의 문서 정보 가져오기
         top_ids = sorted_fused_ids[:n_results]
-        final_results = self.collection.get(ids=top_ids, include=["documents", "metadatas"])
+        stage_start = time.perf_counter()
+        # 컬렉션 재조회 없이 코퍼스 저장소에서 상위 문서만 꺼냄
+        final_results = self.corpus.get(top_ids)
         
         # --- 4단계: 날짜 기반 2차 정렬 (최신순) ---
         print("4️⃣  날짜 기반 정렬 및 가중치 적용...")
@@ -586,6 +738,7 @@ class KNOUChatbot:
                 data = id_to_data[doc_id]
                 print(f"   {i+1}. 최종: {data['final_score']:.4f} [{data['date']}]")
             
+            trace.record("date_rerank", time.perf_counter() - stage_start, documents=len(sorted_ids))
             return {
                 'ids': [sorted_ids],
                 'documents': [final_docs],
@@ -599,13 +752,14 @@ class KNOUChatbot:
             final_docs = [id_to_doc[doc_id][0] for doc_id in top_ids if doc_id in id_to_doc]
             final_metas = [id_to_doc[doc_id][1] for doc_id in top_ids if doc_id in id_to_doc]
             
+            trace.record("date_rerank", time.perf_counter() - stage_start, documents=len(final_docs))
             return {
                 'ids': [top_ids],
                 'documents': [final_docs],
                 'metadatas': [final_metas]
             }
     
-    def generate_answer(self, query: str, context_docs: list, context_metas: list = None):
+    def generate_answer(self, query: str, context_docs: list, context_metas: list = None, trace: RequestTrace = None):
         """검색된 문서를 바탕으로 답변 생성 (스트리밍 및 안전 설정 완화)"""
         
         context_parts = []
@@ -656,6 +810,9 @@ class KNOUChatbot:
 **답변 (Markdown 형식):**
 """
 
+        trace = trace or RequestTrace()
+        stage_start = time.perf_counter()
+        chunk_count = 0
         try:
             # 안전 설정 완화 및 스트리밍 활성화
             response = self.gen_model.generate_content(
@@ -669,30 +826,75 @@ class KNOUChatbot:
                 }
             )
             for chunk in response:
+                chunk_count += 1
                 yield chunk.text
         except Exception as e:
             print(f"❌ 답변 생성 중 오류: {e}")
             yield "죄송합니다, 답변을 생성하는 동안 오류가 발생했습니다."
+            return False
+        trace.record("generation", time.perf_counter() - stage_start,
+                     prompt_chars=len(prompt), context_docs=len(context_docs), chunks=chunk_count)
+        return True
 
     def chat(self, query: str):
         """전체 RAG 프로세스 실행 (스트리밍 답변 생성)"""
-        print(f"🔍 검색 중: '{query}'")
-        
-        # 1. 관련 문서 검색
-        search_results = self.search_documents(query)
-        if not search_results or not search_results['documents'][0]:
-            yield "죄송합니다. 관련된 정보를 찾을 수 없습니다."
-            return
-
-        # 2. 검색 결과 출력
-        documents = search_results['documents'][0]
-        metadatas = search_results.get('metadatas', [None])[0] if search_results.get('metadatas') else None
-        print(f"📚 {len(documents)}개의 관련 문서를 찾았습니다.")
-        
-        # 3. 답변 생성 (스트리밍)
-        print("💭 스트리밍 답변 생성 중...")
-        yield from self.generate_answer(query, documents, metadatas)
-        print("\n✅ 스트리밍 완료.")
+        trace = RequestTrace()
+        outcome = "cancelled"  # 끝까지 전달되기 전에 클라이언트가 연결을 끊은 경우
+        try:
+            # 0. 답변 캐시 확인 (같은 질문 또는 임베딩이 매우 가까운 질문)
+            # 유사 질문 비교에는 원본 질문 벡터 검색과 같은 텍스트의 임베딩을 사용 → 캐시 조회, 검색, 캐시 저장이
+            # 임베딩 요청 한 번을 공유 (캐시 때문에 첫 답변 전에 임베딩 왕복이 추가되지 않음)
+            query_embeddings = {}
+            retrieval_query = self.retrieval_query(query)
+            def embed_query(_):
+                return self._embed_queries([retrieval_query], query_embeddings)[0]
+
+            stage_start = time.perf_counter()
+            cached_answer = self.answer_cache.get(query, embed=embed_query)
+            trace.record("answer_cache", time.perf_counter() - stage_start, hit=int(cached_answer is not None))
+            if cached_answer is not None:
+                print(f"⚡ 캐시된 답변 사용: '{query}'")
+                outcome = "cache_hit"
+                yield from replay(cached_answer)
+                return
+
+            print(f"🔍 검색 중: '{query}'")
+            
+            # 1. 관련 문서 검색
+            search_results = self.search_documents(query, trace=trace, query_embeddings=query_embeddings)
+            if not search_results or not search_results['documents'][0]:
+                outcome = "no_results"
+                yield "죄송합니다. 관련된 정보를 찾을 수 없습니다."
+                return
+
+            # 2. 검색 결과 출력
+            documents = search_results['documents'][0]
+            metadatas = search_results.get('metadatas', [None])[0] if search_results.get('metadatas') else None
+            print(f"📚 {len(documents)}개의 관련 문서를 찾았습니다.")
+            
+            # 3. 답변 생성 (스트리밍)
+            print("💭 스트리밍 답변 생성 중...")
+            answer_parts = []
+            answer_stream = self.generate_answer(query, documents, metadatas, trace=trace)
+            while True:
+                try:
+                    chunk = next(answer_stream)
+                except StopIteration as stop:
+                    succeeded = bool(stop.value)
+                    break
+                if not answer_parts:
+                    # 요청 시작부터 첫 답변 조각까지 걸린 시간
+                    trace.record("ttft", trace.elapsed())
+                answer_parts.append(chunk)
+                yield chunk
+            print("\n✅ 스트리밍 완료.")
+            outcome = "answered" if succeeded else "generation_error"
+
+            # 4. 끝까지 정상 생성된 답변만 캐시에 저장
+            if succeeded:
+                self.answer_cache.put(query, "".join(answer_parts), embed=embed_query)
+        finally:
+            trace.finish(outcome)
 
 def main():
     """메인 함수"""
@@ -0,0 +1,86 @@
+import re
+
+# ✅ 설정
+# 단어 끝에서 떼어낼 조사 (긴 것부터 비교)
+# 이/가/도/의/과/로처럼 명사 끝 글자와 자주 겹치는 조사는 제외 ("학년도", "강의", "학과", "경로")
+PARTICLES = sorted([
+    '에서는', '에게서', '으로는', '으로서', '으로써',
+    '에서', '에게', '으로', '까지', '부터', '처럼', '보다', '에는',
+    '은', '는', '을', '를', '에',
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 2  # 조사를 떼고 남는 어간의 최소 길이 ("학기는" → "학기", "보는"은 그대로)
+
+WORD_PATTERN = re.compile(r"\w+")
+# 한글 / 그 외(숫자, 영문) 구간 분리: "2025학년도" → "2025", "학년도"
+SCRIPT_RUN_PATTERN = re.compile(r"[가-힣]+|[^가-힣_]+")
+HANGUL_RUN_PATTERN = re.compile(r"[가-힣]+$")
+
+
+def strip_particle(word: str) -> str:
+    """한글 단어 끝의 조사 제거 ("등록금을" → "등록금")"""
+    if not HANGUL_RUN_PATTERN.search(word):
+        return word
+    for particle in PARTICLES:
+        if word.endswith(particle) and len(word) - len(particle) >= MIN_STEM_LENGTH:
+            return word[:-len(particle)]
+    return word
+
+
+def split_words(text: str) -> list:
+    """소문자 변환 → 단어 분리 → 조사 제거"""
+    if not text:
+        return []
+    return [strip_particle(word) for word in WORD_PATTERN.findall(text.lower())]
+
+
+def word_terms(word: str) -> list:
+    """단어 하나를 색인 용어로 변환: 한글은 문자 bigram, 숫자/영문은 통째로"""
+    terms = []
+    for run in SCRIPT_RUN_PATTERN.findall(word):
+        if '가' <= run[0] <= '힣':
+            if len(run) == 1:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def analyze(text: str) -> list:
+    """텍스트 → 색인 용어 목록 (색인/질의 공통 분석기)"""
+    terms = []
+    for word in split_words(text):
+        terms.extend(word_terms(word))
+    return terms
+
+
+class KoreanAnalyzer:
+    """한글 bigram 분석기 + 용어 사전 (용어 문자열 → 정수 id)
+
+    색인 구축과 질의 분석이 같은 분석기/사전을 공유하므로,
+    매칭은 문자열 검색 대신 정수 id의 집합/배열 연산으로 처리됩니다.
+    """
+
+    def __init__(self):
+        self.vocab = {}  # term -> term_id
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def index_terms(self, text: str) -> list:
+        """색인용: 처음 보는 용어는 새 id를 부여"""
+        vocab = self.vocab
+        term_ids = []
+        for term in analyze(text):
+            term_id = vocab.get(term)
+            if term_id is None:
+                term_id = len(vocab)
+                vocab[term] = term_id
+            term_ids.append(term_id)
+        return term_ids
+
+    def query_terms(self, text: str) -> set:
+        """질의용: 사전에 있는 용어의 id만 반환 (없는 용어는 어떤 문서와도 매칭되지 않음)"""
+        vocab = self.vocab
+        return {vocab[term] for term in analyze(text) if term in vocab}
@@ -0,0 +1,129 @@
+import json
+import os
+from typing import Optional
+import numpy as np
+
+# ✅ 설정
+# 벡터 검색 방식: chroma (기본, HNSW 색인) / local (메모리 매핑한 임베딩 행렬 전체 비교)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# 색인 세대 디렉토리 안에 저장 → 여러 워커 프로세스가 페이지 캐시의 한 사본을 공유
+VECTOR_STORE_FILE = "vectors.npy"
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")  # float32 / float16 (메모리 절반, 점수 계산은 float32)
+EXPORT_BATCH_SIZE = 5000
+# float16 행렬은 이 행 수만큼만 float32로 변환해 계산 (질문마다 전체 행렬의 float32 사본을 만들지 않음)
+SCORE_BLOCK_ROWS = 4096
+
+
+def ids_path_of(path: str) -> str:
+    return os.path.splitext(path)[0] + "_ids.json"
+
+
+def export_vectors(collection, path: str, dtype: str = VECTOR_DTYPE) -> int:
+    """Chroma 컬렉션의 임베딩 → .npy 행렬(메모리 매핑용) + id 목록 JSON (임시 파일에 쓴 뒤 교체)"""
+    ids = collection.get(include=[])['ids']
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    matrix = None
+    for start in range(0, len(ids), EXPORT_BATCH_SIZE):
+        batch_ids = ids[start:start + EXPORT_BATCH_SIZE]
+        batch = collection.get(ids=batch_ids, include=["embeddings"])
+        # get(ids=...)의 반환 순서가 요청 순서와 다를 수 있으므로 id 기준으로 맞춤
+        rows = dict(zip(batch['ids'], batch['embeddings']))
+        if matrix is None:
+            dim = len(next(iter(rows.values())))
+            matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(len(ids), dim))
+        matrix[start:start + len(batch_ids)] = np.asarray([rows[doc_id] for doc_id in batch_ids], dtype=np.float32)
+    if matrix is None:
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(0, 0))
+    matrix.flush()
+    del matrix
+
+    ids_path = ids_path_of(path)
+    with open(ids_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    os.replace(ids_path + ".tmp", ids_path)
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+class LocalVectorIndex:
+    """메모리 매핑한 임베딩 행렬 전체 비교 검색 (Chroma 기본 거리와 같은 제곱 L2)
+
+    ‖q - x‖² = ‖q‖² - 2·q·x + ‖x‖² 에서 문서 노름 ‖x‖²는 로드 시 한 번만 계산하고,
+    여러 질문을 한 번의 행렬 곱으로 비교한 뒤 argpartition으로 상위 k개만 정렬합니다.
+    float16 행렬은 SCORE_BLOCK_ROWS 행 단위로만 float32로 변환합니다.
+    """
+
+    def __init__(self, ids: list, matrix: np.ndarray):
+        if len(ids) != len(matrix):
+            raise ValueError(f"id 수({len(ids)})와 벡터 수({len(matrix)})가 다릅니다")
+        self.ids = ids
+        self.matrix = matrix
+        self.norms = np.zeros(len(ids), np.float32)
+        for start, block in self._blocks():
+            self.norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        with open(ids_path_of(path), encoding="utf-8") as f:
+            ids = json.load(f)
+        return cls(ids, np.load(path, mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _blocks(self):
+        """(시작 행, float32 행렬 구간) — float32 행렬은 변환 없이 전체 한 번"""
+        if self.matrix.dtype == np.float32:
+            yield 0, self.matrix
+            return
+        for start in range(0, len(self.matrix), SCORE_BLOCK_ROWS):
+            yield start, self.matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+
+    def _dot(self, queries: np.ndarray) -> np.ndarray:
+        """질문 × 문서 내적 (질문 수 × 문서 수, float32)"""
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start, block in self._blocks():
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def query(self, query_embeddings, n_results: int = 10, include_distances: bool = True) -> dict:
+        """collection.query(query_embeddings=..., n_results=...)와 같은 형식 → {'ids', 'distances'}"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        k = min(n_results, len(self.ids))
+        if not k:
+            return {'ids': [[] for _ in queries], 'distances': [[] for _ in queries]}
+
+        # 질문 노름은 순위에 영향이 없지만 Chroma와 같은 거리 값을 위해 더함
+        distances = self.norms[None, :] - 2.0 * self._dot(queries)
+        distances += np.einsum("ij,ij->i", queries, queries)[:, None]
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top_distances = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+
+        result = {'ids': [[self.ids[i] for i in row] for row in top]}
+        if include_distances:
+            result['distances'] = np.take_along_axis(top_distances, order, axis=1).tolist()
+        return result
+
+
+def open_vector_index(path: str, expected_ids: Optional[list] = None) -> Optional[LocalVectorIndex]:
+    """로컬 벡터 색인 로드 (파일이 없거나 컬렉션 id와 다르면 None → Chroma 사용)"""
+    if not os.path.exists(path) or not os.path.exists(ids_path_of(path)):
+        print(f"⚠️ 벡터 파일이 없습니다 ({path}). Chroma 벡터 검색을 사용합니다.")
+        return None
+    try:
+        index = LocalVectorIndex.load(path)
+    except Exception as e:
+        print(f"⚠️ 벡터 파일 로드 실패 ({e}). Chroma 벡터 검색을 사용합니다.")
+        return None
+    if expected_ids is not None and sorted(index.ids) != sorted(expected_ids):
+        print(f"⚠️ 벡터 파일({len(index)}개)이 컬렉션({len(expected_ids)}개)과 달라 Chroma 벡터 검색을 사용합니다.")
+        return None
+    print(f"🧮 로컬 벡터 색인 로드: {path} ({len(index)}개, {index.matrix.dtype})")
+    return index